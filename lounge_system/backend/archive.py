@@ -0,0 +1,329 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+import numpy as np
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+from .database import SessionLocal
+from . import models
+
+try:
+    import fcntl
+except ImportError:  # Windows: archiving is serialised within this process only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Config
+ENTRY_LOG_ARCHIVE_DIR = os.getenv("ENTRY_LOG_ARCHIVE_DIR", "log_archive")
+ENTRY_LOG_HOT_DAYS = int(os.getenv("ENTRY_LOG_HOT_DAYS", "30"))  # 0 keeps every row in the database
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+ARCHIVE_BATCH_ROWS = int(os.getenv("ARCHIVE_BATCH_ROWS", "50000"))  # rows moved per transaction
+
+# Columns of a segment file (one .npz per day and archived id range):
+#   id, user_id, lounge_id (int64, -1 for NULL), timestamp (int64 us since the epoch, UTC),
+#   granted (bool), reason (int32 index into reasons), reasons (unicode dictionary)
+GRANTED = "Access Granted"
+NULL_ID = -1
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_us(at: datetime) -> int:
+    return (at - EPOCH) // timedelta(microseconds=1)
+
+
+def from_us(us: int) -> datetime:
+    return EPOCH + timedelta(microseconds=int(us))
+
+
+class ArchiveStore:
+    """
+    Date-partitioned columnar segments of archived entry logs, one directory per UTC day:
+    <directory>/2026-01-31/<first id>-<last id>-<rows>.npz, written with np.savez_compressed.
+
+    A segment's name is fixed by the rows it holds, so re-archiving the same batch after a crash
+    (rows written but not yet deleted) overwrites it instead of duplicating rows. Writers from
+    several uvicorn workers serialise on an flock of <directory>/lock; readers take no lock.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.lock_path = os.path.join(directory, "lock")
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def lock(self):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                os.close(fd)
+
+    def write(self, day: date, columns: dict) -> str:
+        ids = columns["id"]
+        folder = os.path.join(self.directory, day.isoformat())
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"{ids[0]}-{ids[-1]}-{ids.shape[0]}.npz")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez_compressed(f, **columns)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        return path
+
+    def segments(self, since: date = None, until: date = None):
+        """
+        Segment paths whose day falls in [since, until], oldest first.
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        paths = []
+        for name in sorted(os.listdir(self.directory)):
+            try:
+                day = date.fromisoformat(name)
+            except ValueError:
+                continue
+            if (since and day < since) or (until and day > until):
+                continue
+            folder = os.path.join(self.directory, name)
+            paths.extend(os.path.join(folder, f) for f in sorted(os.listdir(folder)) if f.endswith(".npz"))
+        return paths
+
+    def scan(self, since: datetime = None, until: datetime = None, lounge_id: int = None, status: str = None):
+        """
+        Archived rows with since <= timestamp < until, optionally one lounge and one status, as
+        column arrays (reason decoded to strings). Only the days in range are opened, and each
+        segment is filtered with one vectorised mask.
+        """
+        since_us = to_us(since) if since else None
+        until_us = to_us(until) if until else None
+        last_day = (until - timedelta(microseconds=1)).date() if until else None
+        parts = []
+        for path in self.segments(since.date() if since else None, last_day):
+            with np.load(path) as segment:
+                timestamps = segment["timestamp"]
+                mask = np.ones(timestamps.shape[0], dtype=bool)
+                if since_us is not None:
+                    mask &= timestamps >= since_us
+                if until_us is not None:
+                    mask &= timestamps < until_us
+                if lounge_id is not None:
+                    mask &= segment["lounge_id"] == lounge_id
+                if status is not None:
+                    mask &= segment["granted"] == (status == GRANTED)
+                if not mask.any():
+                    continue
+                parts.append({
+                    "id": segment["id"][mask],
+                    "user_id": segment["user_id"][mask],
+                    "lounge_id": segment["lounge_id"][mask],
+                    "timestamp": timestamps[mask],
+                    "granted": segment["granted"][mask],
+                    "reason": segment["reasons"][segment["reason"][mask]],
+                })
+        if not parts:
+            return {
+                "id": np.empty(0, dtype=np.int64), "user_id": np.empty(0, dtype=np.int64),
+                "lounge_id": np.empty(0, dtype=np.int64), "timestamp": np.empty(0, dtype=np.int64),
+                "granted": np.empty(0, dtype=bool), "reason": np.empty(0, dtype=str),
+            }
+        return {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+
+    def summary(self, since: datetime = None, until: datetime = None, lounge_id: int = None, status: str = None):
+        """
+        Totals and per-day / per-lounge counts of the archived rows matching the filters.
+        """
+        return self.summary_of(self.scan(since, until, lounge_id, status))
+
+    @staticmethod
+    def summary_of(rows: dict):
+        granted = rows["granted"]
+        days = rows["timestamp"] // (86_400 * 1_000_000)
+        by_day = []
+        for day, count in zip(*np.unique(days, return_counts=True)):
+            in_day = days == day
+            by_day.append({
+                "day": (EPOCH + timedelta(days=int(day))).date().isoformat(),
+                "granted": int(np.count_nonzero(granted & in_day)),
+                "denied": int(count - np.count_nonzero(granted & in_day)),
+            })
+        lounges, lounge_index = np.unique(rows["lounge_id"], return_inverse=True)
+        lounge_granted = np.bincount(lounge_index, weights=granted, minlength=lounges.shape[0])
+        lounge_total = np.bincount(lounge_index, minlength=lounges.shape[0])
+        return {
+            "matched": int(granted.shape[0]),
+            "granted": int(np.count_nonzero(granted)),
+            "denied": int(granted.shape[0] - np.count_nonzero(granted)),
+            "by_day": by_day,
+            "by_lounge": [
+                {"lounge_id": None if lounge == NULL_ID else int(lounge), "granted": int(g), "denied": int(t - g)}
+                for lounge, g, t in zip(lounges, lounge_granted, lounge_total)
+            ],
+        }
+
+    def hourly_counts(self):
+        """
+        (granted, lounge_id or 0, hour, rows) for every archived (status, lounge, hour), segment by
+        segment; stats.rebuild_if_empty adds these to what it counts in the hot table.
+        """
+        hour_us = 3_600 * 1_000_000
+        for path in self.segments():
+            with np.load(path) as segment:
+                keys = np.stack([segment["granted"], segment["lounge_id"], segment["timestamp"] // hour_us])
+            groups, counts = np.unique(keys, axis=1, return_counts=True)
+            for (granted, lounge_id, hour), count in zip(groups.T, counts):
+                yield bool(granted), max(int(lounge_id), 0), from_us(int(hour) * hour_us), int(count)
+
+    def stats(self):
+        paths = self.segments()
+        return {
+            "segments": len(paths),
+            "rows": sum(int(os.path.basename(path)[:-4].rsplit("-", 1)[1]) for path in paths),
+            "bytes": sum(os.path.getsize(path) for path in paths),
+        }
+
+
+class Archiver:
+    """
+    Moves entry logs older than hot_days (counted in whole UTC days) from the database into the
+    ArchiveStore, batch_rows at a time: segments are written and fsynced first, then the same rows
+    are deleted in one keyset-bounded DELETE. The stats aggregates are untouched, so dashboards keep
+    their history; listings and exports in admin_routes only see the hot window.
+    """
+
+    def __init__(self, store: ArchiveStore, hot_days: int, batch_rows: int, interval: float):
+        self.store = store
+        self.hot_days = hot_days
+        self.batch_rows = max(1, batch_rows)
+        self.interval = interval
+        self._task = None
+        self.archived = 0
+        self.last_run_at = None
+        self.last_run_ms = None
+
+    def horizon(self, now: datetime = None) -> datetime:
+        today = (now or datetime.utcnow()).date()
+        return datetime.combine(today - timedelta(days=self.hot_days), datetime.min.time())
+
+    def run_once(self, db: Session, now: datetime = None):
+        """
+        Archive everything older than the horizon. Returns {"archived": rows, "segments": files}.
+        Every worker runs the archiver; they take turns on the store's lock, and whoever comes
+        second finds nothing left to move.
+        """
+        if self.hot_days <= 0:
+            return {"archived": 0, "segments": 0}
+        with self.store.lock():
+            return self._archive(db, now)
+
+    def _archive(self, db: Session, now: datetime = None):
+        start = time.perf_counter()
+        horizon = self.horizon(now)
+        archived = segments = 0
+        while True:
+            rows = db.query(
+                models.EntryLog.id, models.EntryLog.user_id, models.EntryLog.lounge_id,
+                models.EntryLog.timestamp, models.EntryLog.status, models.EntryLog.reason,
+            ).filter(
+                models.EntryLog.timestamp < horizon
+            ).order_by(models.EntryLog.timestamp, models.EntryLog.id).limit(self.batch_rows).all()
+            if not rows:
+                break
+
+            for day, columns in self._columns_by_day(rows):
+                self.store.write(day, columns)
+                segments += 1
+
+            last = rows[-1]
+            db.query(models.EntryLog).filter(
+                models.EntryLog.timestamp < horizon,
+                or_(
+                    models.EntryLog.timestamp < last.timestamp,
+                    and_(models.EntryLog.timestamp == last.timestamp, models.EntryLog.id <= last.id),
+                ),
+            ).delete(synchronize_session=False)
+            db.commit()
+            archived += len(rows)
+            if len(rows) < self.batch_rows:
+                break
+
+        self.archived += archived
+        self.last_run_at = datetime.utcnow()
+        self.last_run_ms = round((time.perf_counter() - start) * 1000, 1)
+        if archived:
+            logger.info(f"Archived {archived} entry logs older than {horizon.date()} into {segments} segments in {self.last_run_ms} ms")
+        return {"archived": archived, "segments": segments}
+
+    def start(self):
+        if self._task is None and self.hot_days > 0:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def shutdown(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self):
+        return dict(
+            self.store.stats(),
+            hot_days=self.hot_days,
+            horizon=self.horizon().isoformat() if self.hot_days > 0 else None,
+            archived_since_start=self.archived,
+            last_run_at=self.last_run_at.isoformat() if self.last_run_at else None,
+            last_run_ms=self.last_run_ms,
+        )
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self._run_in_session)
+            except Exception as e:
+                logger.error(f"Entry log archiving failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def _run_in_session(self):
+        db = SessionLocal()
+        try:
+            self.run_once(db)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _columns_by_day(rows):
+        id_col, user_col, lounge_col, timestamp_col, status_col, reason_col = zip(*rows)
+        ids = np.array(id_col, dtype=np.int64)
+        user_ids = np.array([NULL_ID if user_id is None else user_id for user_id in user_col], dtype=np.int64)
+        lounge_ids = np.array([NULL_ID if lounge_id is None else lounge_id for lounge_id in lounge_col], dtype=np.int64)
+        timestamps = np.array(timestamp_col, dtype="datetime64[us]").astype(np.int64)
+        granted = np.array(status_col, dtype=object) == GRANTED
+        reasons, reason_index = np.unique(np.array([reason or "" for reason in reason_col], dtype=str), return_inverse=True)
+        days = timestamps // (86_400 * 1_000_000)
+
+        # Rows are in timestamp order, so each day is one contiguous run
+        boundaries = np.flatnonzero(np.diff(days)) + 1
+        for start, end in zip(np.concatenate([[0], boundaries]), np.concatenate([boundaries, [len(rows)]])):
+            used, reason = np.unique(reason_index[start:end], return_inverse=True)
+            yield (EPOCH + timedelta(days=int(days[start]))).date(), {
+                "id": ids[start:end],
+                "user_id": user_ids[start:end],
+                "lounge_id": lounge_ids[start:end],
+                "timestamp": timestamps[start:end],
+                "granted": granted[start:end],
+                "reason": reason.astype(np.int32),
+                "reasons": reasons[used],
+            }
+
+
+store = ArchiveStore(ENTRY_LOG_ARCHIVE_DIR)
+archiver = Archiver(store, ENTRY_LOG_HOT_DAYS, ARCHIVE_BATCH_ROWS, ARCHIVE_INTERVAL_SECONDS)
@@ -0,0 +1,240 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from .database import SessionLocal
+from .face_index import FaceGallery
+from . import models
+
+logger = logging.getLogger(__name__)
+
+# Config
+ARRIVALS_REFRESH_SECONDS = float(os.getenv("ARRIVALS_REFRESH_SECONDS", "60"))
+ARRIVALS_WINDOW_DAYS = int(os.getenv("ARRIVALS_WINDOW_DAYS", "2"))  # today + tomorrow keeps midnight warm
+ARRIVALS_GALLERY_CAPACITY = 64  # initial rows per lounge-day gallery; grows as needed
+
+ExpectedBooking = namedtuple("ExpectedBooking", ["id", "is_paid", "slot", "check_out_time"])
+
+
+class Arrival:
+    """
+    A passenger expected at a lounge on a day, with everything the gate needs to decide.
+    """
+    __slots__ = ("user_id", "username", "is_active", "bookings")
+
+    def __init__(self, user_id: int, username: str, is_active: bool):
+        self.user_id = user_id
+        self.username = username
+        self.is_active = is_active
+        self.bookings = []
+
+
+class LoungeDay:
+    """
+    Expected arrivals of one lounge on one day, plus a small gallery of their faces.
+    """
+
+    def __init__(self):
+        self.arrivals = {}  # user_id -> Arrival
+        self.gallery = FaceGallery(ARRIVALS_GALLERY_CAPACITY)
+
+
+class ExpectedArrivals:
+    """
+    Per-lounge, per-day working set built from bookings, users and face embeddings, so the
+    gate decides from memory: 1:1 verification reads the booking status here, and 1:N
+    identification searches only the faces expected at that lounge today.
+
+    A background task rebuilds the window every ARRIVALS_REFRESH_SECONDS; bookings, checkouts,
+    face enrolments and user changes made in this process are applied immediately.
+    A miss (day outside the window, lounge or passenger not in it) returns None and callers fall
+    back to the database or the full gallery: the passenger may have booked through another
+    worker, or straight in the database, since the last refresh.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._days = {}  # (lounge_id, day) -> LoungeDay
+        self._loaded = set()  # days covered by the last refresh
+        self._journal = None  # changes noted while a refresh is building
+        self._task = None
+        self.refreshed_at = None
+        self.refresh_ms = None
+
+    def window(self, now: datetime = None):
+        today = (now or datetime.utcnow()).date()
+        return [today + timedelta(days=i) for i in range(max(1, ARRIVALS_WINDOW_DAYS))]
+
+    def refresh(self, db: Session, days=None):
+        """
+        Rebuild the working set for days (default: the current window) with one query.
+        """
+        start = time.perf_counter()
+        days = sorted(days or self.window())
+        with self._lock:
+            self._journal = []
+
+        try:
+            day_start = datetime.combine(days[0], datetime.min.time())
+            day_end = datetime.combine(days[-1] + timedelta(days=1), datetime.min.time())
+            built = {}
+            for row in self._query(db).filter(models.Booking.date >= day_start, models.Booking.date < day_end):
+                if row.date.date() in days:
+                    self._add_row(built, row)
+
+            with self._lock:
+                for change in self._journal:
+                    change(built)
+                self._days = built
+                self._loaded = set(days)
+        finally:
+            with self._lock:
+                self._journal = None
+
+        self.refreshed_at = datetime.utcnow()
+        self.refresh_ms = round((time.perf_counter() - start) * 1000, 1)
+        logger.info(f"Expected arrivals refreshed: {len(built)} lounge-days in {self.refresh_ms} ms")
+
+    def bookings(self, lounge_id: int, user_id: int, day: date):
+        """
+        The user's bookings at this lounge and day, or None if they are not in the working set.
+        """
+        with self._lock:
+            if day not in self._loaded:
+                return None
+            lounge_day = self._days.get((lounge_id, day))
+            arrival = lounge_day.arrivals.get(user_id) if lounge_day else None
+            return list(arrival.bookings) if arrival else None
+
+    def arrival(self, lounge_id: int, user_id: int, day: date):
+        with self._lock:
+            lounge_day = self._days.get((lounge_id, day))
+            return lounge_day.arrivals.get(user_id) if lounge_day else None
+
+    def search(self, lounge_id: int, day: date, embedding, k: int = 1):
+        """
+        1:N search among the faces expected at this lounge and day; None if that lounge-day is not loaded.
+        """
+        with self._lock:
+            if day not in self._loaded:
+                return None
+            lounge_day = self._days.get((lounge_id, day))
+        if lounge_day is None:
+            return None
+        return lounge_day.gallery.search(embedding, k)
+
+    def note_booking(self, db: Session, booking_id: int):
+        """
+        Add a just-committed booking (one indexed query, off the gate's path).
+        """
+        row = self._query(db).filter(models.Booking.id == booking_id).first()
+        if row is None:
+            return
+        with self._lock:
+            if row.date.date() in self._loaded:
+                self._apply(lambda days: self._add_row(days, row))
+
+    def note_checkout(self, lounge_id: int, day: date, booking_id: int, check_out_time: datetime):
+        def change(days):
+            lounge_day = days.get((lounge_id, day))
+            for arrival in (lounge_day.arrivals.values() if lounge_day else ()):
+                arrival.bookings = [
+                    booking._replace(check_out_time=check_out_time) if booking.id == booking_id else booking
+                    for booking in arrival.bookings
+                ]
+        with self._lock:
+            self._apply(change)
+
+    def note_face(self, user_id: int, embedding):
+        def change(days):
+            for lounge_day in days.values():
+                if user_id in lounge_day.arrivals:
+                    lounge_day.gallery.upsert(user_id, embedding)
+        with self._lock:
+            self._apply(change)
+
+    def note_user(self, user_id: int, username: str, is_active: bool):
+        def change(days):
+            for lounge_day in days.values():
+                arrival = lounge_day.arrivals.get(user_id)
+                if arrival is not None:
+                    arrival.username = username
+                    arrival.is_active = is_active
+        with self._lock:
+            self._apply(change)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def shutdown(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "days": sorted(day.isoformat() for day in self._loaded),
+                "lounge_days": len(self._days),
+                "arrivals": sum(len(lounge_day.arrivals) for lounge_day in self._days.values()),
+                "refreshed_at": self.refreshed_at.isoformat() if self.refreshed_at else None,
+                "refresh_ms": self.refresh_ms,
+            }
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(ARRIVALS_REFRESH_SECONDS)
+            try:
+                await asyncio.to_thread(self._refresh_in_session)
+            except Exception as e:
+                logger.error(f"Expected arrivals refresh failed: {e}")
+
+    def _refresh_in_session(self):
+        db = SessionLocal()
+        try:
+            self.refresh(db)
+        finally:
+            db.close()
+
+    def _apply(self, change):
+        # Caller holds the lock
+        change(self._days)
+        if self._journal is not None:
+            self._journal.append(change)
+
+    @staticmethod
+    def _query(db: Session):
+        return db.query(
+            models.Booking.id, models.Booking.user_id, models.Booking.lounge_id, models.Booking.date,
+            models.Booking.is_paid, models.Booking.slot, models.Booking.check_out_time,
+            models.User.username, models.User.is_active, models.FaceEmbedding.embedding,
+        ).join(
+            models.User, models.User.id == models.Booking.user_id
+        ).outerjoin(
+            models.FaceEmbedding, models.FaceEmbedding.user_id == models.Booking.user_id
+        )
+
+    @staticmethod
+    def _add_row(days, row):
+        lounge_day = days.setdefault((row.lounge_id, row.date.date()), LoungeDay())
+        arrival = lounge_day.arrivals.get(row.user_id)
+        if arrival is None:
+            arrival = lounge_day.arrivals[row.user_id] = Arrival(row.user_id, row.username, row.is_active)
+            if row.embedding is not None:
+                lounge_day.gallery.upsert(row.user_id, row.embedding)
+        if all(booking.id != row.id for booking in arrival.bookings):
+            arrival.bookings.append(ExpectedBooking(row.id, row.is_paid, row.slot, row.check_out_time))
+            arrival.bookings.sort(key=lambda booking: -booking.id)
+
+
+expected = ExpectedArrivals()
+
+@event.listens_for(models.User, "after_update")
+def _note_user(mapper, connection, target):
+    expected.note_user(target.id, target.username, target.is_active)
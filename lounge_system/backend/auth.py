@@ -1,28 +1,27 @@
 import os
+import time
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 from .database import get_db
 from . import models
+from .passwords import pwd_context, verify_password, hash_password as get_password_hash
 
 # SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key") # For demo, hardcoded is fine
 SECRET_KEY = "super-secret-key-for-hackathon-demo"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 # 24 hours for demo
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))  # seconds
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password):
-    return pwd_context.hash(password)
-
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -33,7 +32,114 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+class Principal:
+    """
+    Lightweight, detached snapshot of the authenticated user.
+    """
+    __slots__ = ("id", "username", "role", "is_active")
+
+    def __init__(self, id: int, username: str, role: str, is_active: bool):
+        self.id = id
+        self.username = username
+        self.role = role
+        self.is_active = is_active
+
+    @classmethod
+    def from_user(cls, user: models.User):
+        return cls(user.id, user.username, user.role, user.is_active)
+
+
+class PrincipalCache:
+    """
+    TTL + LRU cache of token -> Principal, so authenticated requests skip the JWT decode and user query.
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # token -> (principal, expires_at)
+        self._tokens_by_user = {}  # user_id -> set of tokens
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, token: str):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    self._drop(token)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, token: str, principal: Principal, token_expires_at: float):
+        """
+        token_expires_at is the token's own exp (unix time); the entry never outlives it.
+        """
+        ttl = min(self.ttl, token_expires_at - time.time())
+        if ttl <= 0:
+            return
+        with self._lock:
+            if token in self._entries:
+                self._drop(token)
+            self._entries[token] = (principal, time.monotonic() + ttl)
+            self._tokens_by_user.setdefault(principal.id, set()).add(token)
+            while len(self._entries) > self.max_size:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for token in list(self._tokens_by_user.get(user_id, ())):
+                self._drop(token)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+    def _drop(self, token):
+        principal, _ = self._entries.pop(token)
+        tokens = self._tokens_by_user.get(principal.id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[principal.id]
+
+
+principal_cache = PrincipalCache(PRINCIPAL_CACHE_TTL, PRINCIPAL_CACHE_SIZE)
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _invalidate_principal(mapper, connection, target):
+    # Deactivation, role changes etc. must not be served from a stale snapshot
+    principal_cache.invalidate_user(target.id)
+
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    return principal_from_token(token, db)
+
+def principal_from_token(token: str, db: Session) -> Principal:
+    """
+    Resolve a bearer token outside the Authorization header (e.g. ?token= on event streams).
+    """
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -50,14 +156,16 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     user = db.query(models.User).filter(models.User.username == username).first()
     if user is None:
         raise credentials_exception
-    return user
+    principal = Principal.from_user(user)
+    principal_cache.put(token, principal, payload.get("exp", 0))
+    return principal
 
-def get_current_active_user(current_user: models.User = Depends(get_current_user)):
+def get_current_active_user(current_user: Principal = Depends(get_current_user)):
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
-def get_admin_user(current_user: models.User = Depends(get_current_active_user)):
+def get_admin_user(current_user: Principal = Depends(get_current_active_user)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not enough permissions")
     return current_user
@@ -0,0 +1,233 @@
+import os
+import threading
+import logging
+from datetime import date, datetime
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+from . import models, catalog
+
+logger = logging.getLogger(__name__)
+
+# Config
+# Slots always offered for a day, even before anyone has booked them
+DEFAULT_SLOTS = [s for s in os.getenv("LOUNGE_SLOTS", ",".join(f"{h:02d}:00-{h + 2:02d}:00" for h in range(0, 24, 2))).split(",") if s]
+
+def normalize_slot(slot: str) -> str:
+    """
+    "10:00 - 12:00" and "10:00-12:00" are the same slot.
+    """
+    return "".join(slot.split())
+
+def bookable_slot(slot: str):
+    """
+    The normalized slot if it is one of DEFAULT_SLOTS, else None. Invented slot names would
+    each get their own seat counter and slip past the per-slot limit.
+    """
+    slot = normalize_slot(slot)
+    return slot if slot in DEFAULT_SLOTS else None
+
+def bookable_day(day: date, today: date = None) -> bool:
+    """
+    Bookings are for today (UTC) or later.
+    """
+    return day >= (today or datetime.utcnow().date())
+
+def reserve(db: Session, lounge_id: int, day: date, slot: str) -> bool:
+    """
+    Take one seat in (lounge, day, slot) if the slot is below the lounge's seat count.
+    Each check-and-increment is a single conditional UPDATE, so concurrent bookings cannot oversell.
+    This is the only capacity gate for bookings: Lounge.occupancy counts who is inside right now
+    (see check_in / check_out), not who has booked.
+    Runs in the caller's transaction; returns False (and changes nothing) when full.
+    """
+    slot = normalize_slot(slot)
+    _ensure_row(db, lounge_id, day, slot)
+
+    seats = select(models.Lounge.total_seats).where(models.Lounge.id == lounge_id).scalar_subquery()
+    taken = db.execute(
+        update(models.SlotOccupancy)
+        .where(
+            models.SlotOccupancy.lounge_id == lounge_id,
+            models.SlotOccupancy.day == day,
+            models.SlotOccupancy.slot == slot,
+            models.SlotOccupancy.booked < seats,
+        )
+        .values(booked=models.SlotOccupancy.booked + 1)
+    ).rowcount == 1
+    if taken:
+        _pending(db).append((lounge_id, day, slot, 1))
+    return taken
+
+def release(db: Session, lounge_id: int, day: date, slot: str) -> bool:
+    """
+    Give back a seat taken by reserve (check-out or cancellation). Never goes below zero.
+    """
+    slot = normalize_slot(slot)
+    released = _release_slot(db, lounge_id, day, slot)
+    if released:
+        _pending(db).append((lounge_id, day, slot, -1))
+    return released
+
+def check_in(db: Session, booking_id: int, lounge_id: int, at: datetime = None) -> bool:
+    """
+    Count the passenger of a booking as inside the lounge, once: only the UPDATE that sets
+    check_in_time (on a booking not yet checked out) adds to the live occupancy.
+    Runs in the caller's transaction.
+    """
+    checked_in = db.execute(
+        update(models.Booking)
+        .where(
+            models.Booking.id == booking_id,
+            models.Booking.check_in_time.is_(None),
+            models.Booking.check_out_time.is_(None),
+        )
+        .values(check_in_time=at or datetime.utcnow())
+    ).rowcount == 1
+    if checked_in:
+        db.execute(
+            update(models.Lounge)
+            .where(models.Lounge.id == lounge_id)
+            .values(occupancy=models.Lounge.occupancy + 1)
+        )
+        _occupancy_changed(db).add(lounge_id)
+    return checked_in
+
+def check_out(db: Session, lounge_id: int):
+    """
+    The passenger of a checked-in booking left: one fewer inside. Never goes below zero.
+    """
+    db.execute(
+        update(models.Lounge)
+        .where(models.Lounge.id == lounge_id, models.Lounge.occupancy > 0)
+        .values(occupancy=models.Lounge.occupancy - 1)
+    )
+    _occupancy_changed(db).add(lounge_id)
+
+def has_room(db: Session, lounge_id: int, booking_id: int = None) -> bool:
+    """
+    True if someone can walk in right now: occupancy is below total_seats, or booking_id is
+    already checked in and so already counted. A gate check, not a reservation; the seat is
+    taken by check_in when the entry log is written.
+    """
+    lounge = db.query(models.Lounge.occupancy, models.Lounge.total_seats).filter(models.Lounge.id == lounge_id).first()
+    if lounge is None:
+        return False
+    if lounge.occupancy < lounge.total_seats:
+        return True
+    if booking_id is None:
+        return False
+    return db.query(models.Booking.id).filter(
+        models.Booking.id == booking_id,
+        models.Booking.check_in_time.isnot(None),
+        models.Booking.check_out_time.is_(None),
+    ).first() is not None
+
+def _release_slot(db: Session, lounge_id: int, day: date, slot: str) -> bool:
+    return db.execute(
+        update(models.SlotOccupancy)
+        .where(
+            models.SlotOccupancy.lounge_id == lounge_id,
+            models.SlotOccupancy.day == day,
+            models.SlotOccupancy.slot == slot,
+            models.SlotOccupancy.booked > 0,
+        )
+        .values(booked=models.SlotOccupancy.booked - 1)
+    ).rowcount == 1
+
+def _ensure_row(db: Session, lounge_id: int, day: date, slot: str):
+    table = models.SlotOccupancy.__table__
+    values = {"lounge_id": lounge_id, "day": day, "slot": slot, "booked": 0}
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        db.execute(insert(table).values(**values).on_conflict_do_nothing())
+        return
+
+    exists = db.execute(
+        select(table.c.booked).where(table.c.lounge_id == lounge_id, table.c.day == day, table.c.slot == slot)
+    ).first()
+    if exists is None:
+        db.execute(table.insert().values(**values))
+
+def _pending(db: Session):
+    # Index updates wait for the commit so the index never shows an uncommitted reservation
+    return db.info.setdefault("capacity_deltas", [])
+
+def _occupancy_changed(db: Session):
+    return db.info.setdefault("occupancy_lounges", set())
+
+
+class AvailabilityIndex:
+    """
+    In-memory view of booked seats per (lounge, day, slot), answering "which slots have room"
+    without touching bookings. Each (lounge, day) is loaded with one small query on first use,
+    then kept current from committed reservations in this process. Other worker processes'
+    bookings are picked up when the entry is reloaded (see refresh_after).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._days = {}  # (lounge_id, day) -> {slot: booked}
+        self._seats = {}  # lounge_id -> total_seats
+
+    def availability(self, db: Session, lounge_id: int, day: date):
+        with self._lock:
+            slots = self._days.get((lounge_id, day))
+            seats = self._seats.get(lounge_id)
+        if slots is None or seats is None:
+            slots, seats = self._load(db, lounge_id, day)
+            if seats is None:
+                return None
+
+        names = list(DEFAULT_SLOTS) + sorted(set(slots) - set(DEFAULT_SLOTS))
+        return [
+            {"slot": name, "booked": slots.get(name, 0), "remaining": max(0, seats - slots.get(name, 0))}
+            for name in names
+        ]
+
+    def apply(self, lounge_id: int, day: date, slot: str, delta: int):
+        with self._lock:
+            slots = self._days.get((lounge_id, day))
+            if slots is not None:
+                slots[slot] = max(0, slots.get(slot, 0) + delta)
+
+    def invalidate(self, lounge_id: int = None):
+        with self._lock:
+            if lounge_id is None:
+                self._days.clear()
+                self._seats.clear()
+                return
+            self._seats.pop(lounge_id, None)
+            for key in [key for key in self._days if key[0] == lounge_id]:
+                del self._days[key]
+
+    def _load(self, db: Session, lounge_id: int, day: date):
+        seats = db.query(models.Lounge.total_seats).filter(models.Lounge.id == lounge_id).scalar()
+        rows = db.query(models.SlotOccupancy.slot, models.SlotOccupancy.booked).filter(
+            models.SlotOccupancy.lounge_id == lounge_id, models.SlotOccupancy.day == day
+        ).all()
+        slots = dict(rows)
+        if seats is not None:
+            with self._lock:
+                self._seats[lounge_id] = seats
+                self._days[(lounge_id, day)] = slots
+        return slots, seats
+
+
+index = AvailabilityIndex()
+
+@event.listens_for(Session, "after_commit")
+def _apply_committed(session):
+    for lounge_id, day, slot, delta in session.info.pop("capacity_deltas", []):
+        index.apply(lounge_id, day, slot, delta)
+    # Occupancy is changed with bulk UPDATEs, which the catalog's ORM hooks do not see
+    for lounge_id in session.info.pop("occupancy_lounges", ()):
+        catalog.cache.invalidate_lounge(lounge_id)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_rolled_back(session, previous_transaction):
+    session.info.pop("capacity_deltas", None)
+    session.info.pop("occupancy_lounges", None)
@@ -0,0 +1,117 @@
+import os
+import time
+import hashlib
+import threading
+from itertools import chain
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from . import models, schemas
+
+# Config
+# Upper bound on staleness for changes made by other processes (e.g. bookings on another uvicorn worker)
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "30"))
+
+# Keys
+LOUNGES = ("lounges",)
+
+def lounge_key(lounge_id: int):
+    return ("lounge", lounge_id)
+
+def menu_key(lounge_id: int):
+    return ("menu", lounge_id)
+
+def page_key(key, offset: int, limit):
+    """
+    One limit/offset page of a list key; invalidating the list key drops all of its pages.
+    """
+    return key + (offset, limit)
+
+
+class CatalogCache:
+    """
+    Read-through cache of pre-serialized catalog responses (lounge list, lounge detail, menus).
+
+    Each entry holds the JSON body and a strong ETag derived from it. Invalidation bumps a
+    generation counter, so a build that raced with a write is never stored.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries = {}  # key -> (body, etag, expires_at)
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, key, build):
+        """
+        Return (body, etag), calling build() for the payload on a miss; None if build() returns None.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] > now:
+                self.hits += 1
+                return entry[0], entry[1]
+            self.misses += 1
+            generation = self._generation
+
+        payload = build()
+        if payload is None:
+            return None
+        body = schemas.dumps(payload)
+        etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+        with self._lock:
+            if self._generation == generation:
+                self._entries[key] = (body, etag, now + self.ttl)
+        return body, etag
+
+    def invalidate(self, *keys):
+        """
+        Drop each key and every key it prefixes (the pages of a list).
+        """
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                for existing in [existing for existing in self._entries if existing[:len(key)] == key]:
+                    del self._entries[existing]
+
+    def invalidate_lounge(self, lounge_id: int):
+        self.invalidate(LOUNGES, lounge_key(lounge_id))
+
+    def invalidate_menu(self, lounge_id: int):
+        # The lounge detail embeds its menu
+        self.invalidate(menu_key(lounge_id), lounge_key(lounge_id))
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+cache = CatalogCache(CATALOG_CACHE_TTL)
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    pending = session.info.setdefault("catalog_changes", set())
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, models.Lounge):
+            pending.add(("lounge", obj.id))
+        elif isinstance(obj, models.MenuItem):
+            pending.add(("menu", obj.lounge_id))
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    # Invalidate only once the change is visible to other sessions
+    for kind, lounge_id in session.info.pop("catalog_changes", ()):
+        if kind == "lounge":
+            cache.invalidate_lounge(lounge_id)
+        else:
+            cache.invalidate_menu(lounge_id)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_rolled_back(session, previous_transaction):
+    session.info.pop("catalog_changes", None)
@@ -0,0 +1,119 @@
+import os
+import json
+import struct
+import logging
+import numpy as np
+from sqlalchemy import LargeBinary, text
+from sqlalchemy.types import TypeDecorator
+
+logger = logging.getLogger(__name__)
+
+# Config
+EMBEDDING_QUANTIZE = os.getenv("EMBEDDING_QUANTIZE", "0") == "1"  # store int8 instead of float32
+DEFAULT_MODEL_NAME = "ArcFace"
+
+# Blob layout: header, then `dim` float32 or int8 values (little endian)
+#   magic(4s) version(B) dtype(B) dim(H) model_name(16s) scale(f)
+MAGIC = b"LXEM"
+VERSION = 1
+HEADER = struct.Struct("<4sBBH16sf")
+DTYPE_FLOAT32 = 0
+DTYPE_INT8 = 1
+
+
+def encode(vector, model_name: str = DEFAULT_MODEL_NAME, quantize: bool = EMBEDDING_QUANTIZE) -> bytes:
+    """
+    Pack an embedding into a self-describing binary blob.
+    """
+    values = np.asarray(vector, dtype=np.float32).ravel()
+    if quantize:
+        peak = float(np.abs(values).max()) if values.size else 0.0
+        scale = peak / 127 if peak else 1.0
+        payload = np.round(values / scale).astype(np.int8)
+        dtype = DTYPE_INT8
+    else:
+        scale = 1.0
+        payload = values
+        dtype = DTYPE_FLOAT32
+    header = HEADER.pack(MAGIC, VERSION, dtype, values.size, model_name.encode()[:16], scale)
+    return header + payload.astype("<" + payload.dtype.str[1:], copy=False).tobytes()
+
+
+def read_header(blob: bytes):
+    """
+    Return (model_name, dim, dtype, scale) from a blob header.
+    """
+    magic, version, dtype, dim, model_name, scale = HEADER.unpack_from(blob)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not an embedding blob")
+    return model_name.rstrip(b"\0").decode(), dim, dtype, scale
+
+
+def decode(blob: bytes) -> np.ndarray:
+    """
+    Unpack a blob into a float32 vector.
+    float32 blobs are returned as a zero-copy, read-only view over the blob.
+    """
+    _, dim, dtype, scale = read_header(blob)
+    if dtype == DTYPE_FLOAT32:
+        return np.frombuffer(blob, dtype="<f4", count=dim, offset=HEADER.size)
+    return np.frombuffer(blob, dtype=np.int8, count=dim, offset=HEADER.size).astype(np.float32) * np.float32(scale)
+
+
+class EmbeddingType(TypeDecorator):
+    """
+    Column type storing embeddings as packed blobs; accepts lists or arrays, yields float32 arrays.
+    """
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return encode(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return decode(bytes(value))
+
+    def compare_values(self, x, y):
+        # Arrays do not support truthy ==; any reassignment counts as a change
+        return x is y
+
+
+def migrate_json_embeddings(engine, batch_size: int = 1000):
+    """
+    Convert face_embeddings rows still stored as JSON text (pre-blob databases) into packed blobs.
+    Walks the table in id order, batch_size rows at a time.
+    """
+    converted = 0
+    last_id = 0
+    with engine.begin() as conn:
+        while True:
+            rows = conn.execute(
+                text("SELECT id, embedding FROM face_embeddings WHERE id > :last_id ORDER BY id LIMIT :limit"),
+                {"last_id": last_id, "limit": batch_size},
+            ).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            updates = []
+            for row_id, value in rows:
+                if value is None:
+                    continue
+                if isinstance(value, (bytes, memoryview)):
+                    value = bytes(value)
+                    if value[:4] == MAGIC:
+                        continue
+                    value = value.decode()
+                vector = json.loads(value) if isinstance(value, str) else value
+                updates.append({"blob": encode(vector), "id": row_id})
+            if updates:
+                conn.execute(text("UPDATE face_embeddings SET embedding = :blob WHERE id = :id"), updates)
+                converted += len(updates)
+    if converted:
+        logger.info(f"Migrated {converted} JSON face embeddings to binary blobs")
+    return converted
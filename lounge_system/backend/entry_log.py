@@ -0,0 +1,173 @@
+import os
+import time
+import queue
+import asyncio
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import Future
+from datetime import datetime
+from sqlalchemy import insert
+from .database import SessionLocal
+from . import models, stats, events, metrics, capacity
+
+logger = logging.getLogger(__name__)
+
+# Config
+# "async": respond as soon as the event is queued; "flush": respond once it is committed
+ENTRY_LOG_DURABILITY = os.getenv("ENTRY_LOG_DURABILITY", "async")
+ENTRY_LOG_BATCH_SIZE = int(os.getenv("ENTRY_LOG_BATCH_SIZE", "200"))
+ENTRY_LOG_FLUSH_MS = float(os.getenv("ENTRY_LOG_FLUSH_MS", "50"))
+ENTRY_LOG_QUEUE_SIZE = int(os.getenv("ENTRY_LOG_QUEUE_SIZE", "10000"))
+
+_STOP = object()
+
+
+class EntryLogWriter:
+    """
+    Background writer that takes entry-log inserts (and their stats) off the gate's critical path.
+
+    Events are queued in memory and written by one thread with a bulk insert every
+    batch_size events or flush_ms milliseconds, whichever comes first.
+    """
+
+    def __init__(self, batch_size: int, flush_ms: float, queue_size: int, durability: str):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_ms / 1000
+        self.durability = durability
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.written = 0
+        self.failed = 0
+        self.dropped = 0  # not queued because the queue was full
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="entry-log-writer", daemon=True)
+                self._thread.start()
+
+    def shutdown(self):
+        """
+        Flush everything still queued, then stop the writer thread.
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def submit(self, user_id, lounge_id: int, granted: bool, reason: str, timestamp: datetime = None, username: str = None,
+               booking_id: int = None, block: bool = True) -> Future:
+        """
+        Queue one gate decision. The returned future resolves once it has been committed.
+        A granted decision with its booking_id also checks that booking in (live lounge occupancy).
+        If the queue is full, waits for room (backpressure), or raises queue.Full when block is False.
+        """
+        self.start()
+        future = Future()
+        event = {
+            "user_id": user_id,
+            "lounge_id": lounge_id,
+            "status": "Access Granted" if granted else "Access Denied",
+            "reason": reason,
+            "timestamp": timestamp or datetime.utcnow(),
+        }
+        self._queue.put((event, future, username, booking_id if granted else None), block=block)
+        return future
+
+    async def log(self, user_id, lounge_id: int, granted: bool, reason: str, username: str = None, booking_id: int = None):
+        """
+        Async entry point for routes; waits for the commit only in "flush" durability mode.
+        Never waits for queue room: with the queue full the decision stands but is not logged
+        (nor checked in), and is counted in dropped.
+        """
+        try:
+            future = self.submit(user_id, lounge_id, granted, reason, username=username, booking_id=booking_id, block=False)
+        except queue.Full:
+            self.dropped += 1
+            logger.warning(f"Entry log queue full, dropped the decision for user {user_id} at lounge {lounge_id}")
+            return
+        if self.durability == "flush":
+            await asyncio.wrap_future(future)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+
+        # Drain whatever arrived after the stop marker
+        leftover = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                leftover.append(item)
+        for start in range(0, len(leftover), self.batch_size):
+            self._flush(leftover[start:start + self.batch_size])
+
+    def _flush(self, batch):
+        rows = [event for event, _, _, _ in batch]
+        start = time.perf_counter()
+        db = SessionLocal()
+        occupied = set()
+        try:
+            db.execute(insert(models.EntryLog), rows)
+            for event, _, _, booking_id in batch:
+                if booking_id is not None and capacity.check_in(db, booking_id, event["lounge_id"], event["timestamp"]):
+                    occupied.add(event["lounge_id"])
+            counts = Counter(
+                (row["lounge_id"], row["status"] == "Access Granted", stats.hour_bucket(row["timestamp"]))
+                for row in rows
+            )
+            for (lounge_id, granted, bucket), amount in counts.items():
+                stats.record_entry(db, lounge_id, granted, bucket, amount)
+            lounges = db.query(models.Lounge.id, models.Lounge.occupancy, models.Lounge.total_seats).filter(
+                models.Lounge.id.in_(occupied)
+            ).all() if occupied else []
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            self.failed += len(rows)
+            logger.error(f"Failed to write {len(rows)} entry logs: {e}")
+            for _, future, _, _ in batch:
+                future.set_exception(e)
+            return
+        finally:
+            db.close()
+
+        self.written += len(rows)
+        metrics.observe_stage("entry_log_flush", time.perf_counter() - start)
+        for event, future, username, _ in batch:
+            future.set_result(None)
+            events.hub.publish(events.ENTRIES, dict(event, username=username), lounge_id=event["lounge_id"])
+        # Lounges someone just checked into
+        for lounge in lounges:
+            events.hub.publish_occupancy(lounge)
+
+
+writer = EntryLogWriter(ENTRY_LOG_BATCH_SIZE, ENTRY_LOG_FLUSH_MS, ENTRY_LOG_QUEUE_SIZE, ENTRY_LOG_DURABILITY)
@@ -0,0 +1,196 @@
+import os
+import json
+import asyncio
+import logging
+import threading
+from datetime import date, datetime
+
+logger = logging.getLogger(__name__)
+
+# Config
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "256"))  # per subscriber; overflow drops the subscriber
+EVENT_MAX_SUBSCRIBERS = int(os.getenv("EVENT_MAX_SUBSCRIBERS", "10000"))
+EVENT_KEEPALIVE_SECONDS = float(os.getenv("EVENT_KEEPALIVE_SECONDS", "15"))
+
+# Topics
+OCCUPANCY = "occupancy"
+ENTRIES = "entries"
+ORDERS = "orders"
+TOPICS = (OCCUPANCY, ENTRIES, ORDERS)
+
+_DROPPED = object()
+
+
+class HubFull(Exception):
+    """
+    Raised when EVENT_MAX_SUBSCRIBERS streams are already open; callers should answer 503.
+    """
+
+
+class Message:
+    """
+    One published event, serialized once no matter how many subscribers receive it.
+    """
+    __slots__ = ("topic", "lounge_id", "data", "_sse")
+
+    def __init__(self, topic: str, lounge_id, payload: dict):
+        self.topic = topic
+        self.lounge_id = lounge_id
+        self.data = json.dumps({"topic": topic, "data": payload}, default=_json_default)
+        self._sse = None
+
+    def sse(self) -> bytes:
+        if self._sse is None:
+            self._sse = f"event: {self.topic}\ndata: {self.data}\n\n".encode()
+        return self._sse
+
+
+class Subscription:
+    """
+    A bounded per-client buffer. Only touched from the event loop thread.
+    """
+
+    def __init__(self, hub, topics, lounge_id, queue_size: int):
+        self.hub = hub
+        self.topics = frozenset(topics)
+        self.lounge_id = lounge_id
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False
+
+    def wants(self, message: Message) -> bool:
+        if message.topic not in self.topics:
+            return False
+        return self.lounge_id is None or message.lounge_id is None or message.lounge_id == self.lounge_id
+
+    def offer(self, message: Message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Too slow to keep up: free the buffer and tell the client to reconnect
+            self.dropped = True
+            self.end()
+            self.hub.unsubscribe(self)
+
+    def end(self):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(_DROPPED)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        """
+        Next message, or None after EVENT_KEEPALIVE_SECONDS of silence; ends once dropped or closed.
+        """
+        try:
+            message = await asyncio.wait_for(self.queue.get(), EVENT_KEEPALIVE_SECONDS)
+        except asyncio.TimeoutError:
+            return None
+        if message is _DROPPED:
+            raise StopAsyncIteration
+        return message
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class EventHub:
+    """
+    In-process pub/sub for live lounge screens and the admin dashboard.
+
+    publish() may be called from any thread (sync routes, the entry-log writer); fan-out
+    always happens on the event loop, with one hand-off per publish rather than per subscriber.
+    The latest occupancy of each lounge is retained and replayed to new subscribers.
+    """
+
+    def __init__(self, queue_size: int, max_subscribers: int):
+        self.queue_size = max(1, queue_size)
+        self.max_subscribers = max_subscribers
+        self._subscribers = set()
+        self._loop = None
+        self._lock = threading.Lock()
+        self._retained = {}  # lounge_id -> last occupancy Message
+        self.published = 0
+        self.dropped = 0
+
+    @property
+    def full(self) -> bool:
+        return len(self._subscribers) >= self.max_subscribers
+
+    def subscribe(self, topics=TOPICS, lounge_id: int = None) -> Subscription:
+        """
+        Must be called on the event loop.
+        """
+        if self.full:
+            raise HubFull()
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription(self, topics, lounge_id, self.queue_size)
+        with self._lock:
+            retained = list(self._retained.values())
+        for message in retained:
+            if subscription.wants(message):
+                subscription.offer(message)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        if subscription in self._subscribers:
+            self._subscribers.discard(subscription)
+            if subscription.dropped:
+                self.dropped += 1
+
+    def publish(self, topic: str, payload: dict, lounge_id: int = None):
+        message = Message(topic, lounge_id, payload)
+        with self._lock:
+            self.published += 1
+            if topic == OCCUPANCY and lounge_id is not None:
+                self._retained[lounge_id] = message
+
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            on_loop = asyncio.get_running_loop() is loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._fan_out(message)
+        else:
+            loop.call_soon_threadsafe(self._fan_out, message)
+
+    def publish_occupancy(self, lounge):
+        self.publish(OCCUPANCY, {
+            "lounge_id": lounge.id,
+            "occupancy": lounge.occupancy,
+            "total_seats": lounge.total_seats,
+        }, lounge_id=lounge.id)
+
+    def close(self):
+        """
+        End every open stream (shutdown).
+        """
+        for subscription in list(self._subscribers):
+            subscription.end()
+        self._subscribers.clear()
+
+    def stats(self):
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "dropped_subscribers": self.dropped,
+        }
+
+    def _fan_out(self, message: Message):
+        for subscription in list(self._subscribers):
+            if subscription.wants(message):
+                subscription.offer(message)
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+hub = EventHub(EVENT_QUEUE_SIZE, EVENT_MAX_SUBSCRIBERS)
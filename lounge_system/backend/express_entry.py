@@ -1,44 +1,183 @@
+import os
+import time
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from . import models, face_logic
+from fastapi.concurrency import run_in_threadpool
+from . import models, face_logic, frame_quality, arrivals, capacity
+from .face_index import gallery
 from sqlalchemy.orm import Session
 
-def check_entry_eligibility(db: Session, user: models.User, lounge_id: int, current_image_path: str):
+# Config
+# On by default: entry only inside the booked slot; "0" makes a booking valid for its whole day
+ENTRY_ENFORCE_SLOT = os.getenv("ENTRY_ENFORCE_SLOT", "1") == "1"
+ENTRY_SLOT_GRACE_MINUTES = int(os.getenv("ENTRY_SLOT_GRACE_MINUTES", "30"))  # early arrival allowed
+
+# Decision codes
+GRANTED = "granted"
+FACE_NOT_REGISTERED = "face_not_registered"
+NO_BOOKING = "no_booking"
+NOT_PAID = "not_paid"
+CHECKED_OUT = "checked_out"
+OUTSIDE_SLOT = "outside_slot"
+LOUNGE_FULL = "lounge_full"
+NO_FACE = "no_face"
+FACE_MISMATCH = "face_mismatch"
+INACTIVE_USER = "inactive_user"
+# plus the frame_quality rejection codes (too_blurry, too_dark, too_bright, face_too_small)
+
+
+class Decision:
+    """
+    Outcome of an entry check: a stable code for clients and analytics, the human-readable
+    reason that is logged, and how long each stage took.
+    """
+    __slots__ = ("allowed", "code", "reason", "booking_id", "distance", "timings")
+
+    def __init__(self, allowed: bool, code: str, reason: str, booking_id: int = None, distance: float = None):
+        self.allowed = allowed
+        self.code = code
+        self.reason = reason
+        self.booking_id = booking_id
+        self.distance = distance
+        self.timings = {}
+
+    @classmethod
+    def deny(cls, code: str, reason: str, **kwargs):
+        return cls(False, code, reason, **kwargs)
+
+
+@contextmanager
+def stage(timings: dict, name: str):
     """
-    Consolidated logic for Express Entry.
+    Record how long the enclosed block took, in milliseconds, under timings[name].
     """
-    # 1. Face Verification
-    if not user.face_embedding:
-        return False, "Face not registered"
-    
-    face_result = face_logic.verify_face(user.face_embedding.embedding, current_image_path)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = round((time.perf_counter() - start) * 1000, 3)
+
+
+async def check_entry_eligibility(db: Session, user, lounge_id: int, image: bytes, embed) -> Decision:
+    """
+    Consolidated logic for Express Entry, cheapest stage first:
+    enrolled face (memory) -> booking for today (memory, or one indexed query) -> free seat (one query)
+    -> face inference -> match.
+    embed(image) is awaited only for passengers who could actually be let in.
+    """
+    timings = {}
+
+    # 1. Enrolled face (in-memory gallery)
+    with stage(timings, "gallery"):
+        stored_embedding = gallery.get(user.id)
+    if stored_embedding is None:
+        return timed(Decision.deny(FACE_NOT_REGISTERED, "Face not registered"), timings)
+
+    # 2. Booking, payment, slot and a free seat
+    decision = await check_booking(db, user.id, lounge_id)
+    timings.update(decision.timings)
+    if not decision.allowed:
+        return timed(decision, timings)
+
+    # 3. Face inference (worker pool; poor frames are rejected before the forward pass)
+    try:
+        with stage(timings, "inference"):
+            current_embedding = await embed(image)
+    except frame_quality.PoorFrame as e:
+        return timed(Decision.deny(e.code, e.reason, booking_id=decision.booking_id), timings)
+
+    # 4. Face match
+    with stage(timings, "match"):
+        face_result = face_logic.match_embedding(stored_embedding, current_embedding)
     if not face_result["verified"]:
-        return False, f"Face verification failed (Distance: {face_result['distance']:.4f})"
+        if "distance" not in face_result:
+            return timed(Decision.deny(NO_FACE, face_result["reason"], booking_id=decision.booking_id), timings)
+        return timed(Decision.deny(
+            FACE_MISMATCH,
+            f"Face verification failed (Distance: {face_result['distance']:.4f})",
+            booking_id=decision.booking_id,
+            distance=face_result["distance"],
+        ), timings)
+
+    decision.distance = face_result["distance"]
+    return timed(decision, timings)
+
+def timed(decision: Decision, timings: dict) -> Decision:
+    decision.timings = timings
+    return decision
+
+async def check_booking(db: Session, user_id: int, lounge_id: int, now: datetime = None) -> Decision:
+    """
+    Booking, payment and slot checks, served from the expected-arrivals working set when the
+    passenger is in it, otherwise with one query on the (user_id, lounge_id, date) index.
+    A working-set answer that would deny is confirmed against the database too, so a booking
+    made through another worker since the last refresh is never turned away.
+    If the passenger holds several bookings today, any one that passes lets them in.
+    A usable booking still needs a free seat: entry is refused once occupancy reaches
+    total_seats, unless this booking is already checked in (and so already counted).
+    Database work runs in the threadpool; the working-set lookup never leaves the event loop.
+    """
+    now = now or datetime.utcnow()
+    timings = {}
+    with stage(timings, "booking"):
+        bookings = arrivals.expected.bookings(lounge_id, user_id, now.date())
+        decision = decide(bookings, now) if bookings is not None else None
+        if decision is None or not decision.allowed:
+            decision = await run_in_threadpool(database_decision, db, user_id, lounge_id, now)
+    if decision.allowed:
+        with stage(timings, "capacity"):
+            if not await run_in_threadpool(capacity.has_room, db, lounge_id, decision.booking_id):
+                decision = Decision.deny(LOUNGE_FULL, "Lounge is full", booking_id=decision.booking_id)
+    return timed(decision, timings)
+
+def database_decision(db: Session, user_id: int, lounge_id: int, now: datetime) -> Decision:
+    return decide(query_bookings(db, user_id, lounge_id, now), now)
 
-    # 2. Check Booking Existence for Today
-    today = datetime.utcnow().date()
-    booking = db.query(models.Booking).filter(
-        models.Booking.user_id == user.id,
+def query_bookings(db: Session, user_id: int, lounge_id: int, now: datetime):
+    day_start = datetime.combine(now.date(), datetime.min.time())
+    return db.query(
+        models.Booking.id, models.Booking.is_paid, models.Booking.slot, models.Booking.check_out_time
+    ).filter(
+        models.Booking.user_id == user_id,
         models.Booking.lounge_id == lounge_id,
-        # models.Booking.date == today # In real app, check date. For demo, simplified.
-    ).first()
+        models.Booking.date >= day_start,
+        models.Booking.date < day_start + timedelta(days=1),
+    ).order_by(models.Booking.id.desc()).all()
 
-    if not booking:
-        return False, "No booking found for this lounge"
+def decide(bookings, now: datetime) -> Decision:
+    if not bookings:
+        return Decision.deny(NO_BOOKING, "No booking found for this lounge")
+    denials = []
+    for booking in bookings:
+        denial = booking_denial(booking, now)
+        if denial is None:
+            return Decision(True, GRANTED, "Access Granted", booking_id=booking.id)
+        denials.append(denial)
+    code, reason, booking_id = denials[0]
+    return Decision.deny(code, reason, booking_id=booking_id)
 
-    # 3. Check Payment Status
+def booking_denial(booking, now: datetime):
+    """
+    (code, reason, booking_id) if this booking cannot be used right now, else None.
+    """
     if not booking.is_paid:
-        return False, "Booking not paid"
-
-    # 4. Check Slot Validity
-    # Assuming slot is like "HH:MM-HH:MM"
-    # For demo, let's say a booking is valid for the whole day it's booked
-    # But let's add a mock logic for slot check if slot exists
-    if booking.slot:
-        try:
-            # Simple check: current time should be within some range
-            # For hackathon demo, we can just say "valid" if it's the right day
-            pass
-        except:
-            pass
-
-    return True, "Access Granted"
+        return NOT_PAID, "Booking not paid", booking.id
+    if booking.check_out_time is not None:
+        return CHECKED_OUT, "Booking already checked out", booking.id
+    if ENTRY_ENFORCE_SLOT and booking.slot and not in_slot(booking.slot, now):
+        return OUTSIDE_SLOT, f"Outside booked slot {booking.slot}", booking.id
+    return None
+
+def in_slot(slot: str, now: datetime) -> bool:
+    """
+    True if now falls inside an "HH:MM-HH:MM" slot (minus the early-arrival grace).
+    Unparseable slots are treated as valid all day.
+    """
+    try:
+        start, end = ("".join(slot.split())).split("-")
+        start_minutes = int(start[:2]) * 60 + int(start[3:5])
+        end_minutes = int(end[:2]) * 60 + int(end[3:5])
+    except ValueError:
+        return True
+    minutes = now.hour * 60 + now.minute
+    return start_minutes - ENTRY_SLOT_GRACE_MINUTES <= minutes < end_minutes
@@ -0,0 +1,172 @@
+import os
+import threading
+import logging
+import numpy as np
+from sqlalchemy.orm import Session
+from . import models
+
+logger = logging.getLogger(__name__)
+
+# Config
+INITIAL_CAPACITY = 1024
+# Directory of the memory-mapped snapshot shared by all uvicorn workers; empty keeps a private gallery per process
+EMBEDDING_STORE_DIR = os.getenv("EMBEDDING_STORE_DIR", "face_store")
+
+
+class FaceGallery:
+    """
+    Resident 1:N gallery of every enrolled face.
+
+    Embeddings live in one contiguous float32 matrix (one row per user) with a
+    parallel array of user ids, so a probe is matched against everyone with a
+    single matrix-vector product.
+    """
+
+    def __init__(self, initial_capacity: int = INITIAL_CAPACITY):
+        self.initial_capacity = initial_capacity
+        self._lock = threading.RLock()
+        self._matrix = None
+        self._user_ids = np.empty(0, dtype=np.int64)
+        self._rows = {}  # user_id -> row index
+        self._size = 0
+        self.dim = None
+
+    def __len__(self):
+        return self._size
+
+    def load(self, db: Session):
+        """
+        (Re)build the gallery from every FaceEmbedding row.
+        """
+        rows = db.query(models.FaceEmbedding.user_id, models.FaceEmbedding.embedding).all()
+        with self._lock:
+            self._matrix = None
+            self._user_ids = np.empty(0, dtype=np.int64)
+            self._rows = {}
+            self._size = 0
+            self.dim = None
+            for user_id, embedding in rows:
+                if embedding is not None:
+                    self._upsert(user_id, embedding)
+        logger.info(f"Face gallery loaded with {self._size} embeddings")
+
+    def upsert(self, user_id: int, embedding):
+        with self._lock:
+            self._upsert(user_id, embedding)
+
+    def remove(self, user_id: int):
+        """
+        Drop a user by moving the last row into the freed slot.
+        """
+        with self._lock:
+            row = self._rows.pop(user_id, None)
+            if row is None:
+                return
+            last = self._size - 1
+            if row != last:
+                moved = int(self._user_ids[last])
+                self._matrix[row] = self._matrix[last]
+                self._user_ids[row] = moved
+                self._rows[moved] = row
+            self._size = last
+
+    def get(self, user_id: int):
+        """
+        Return a copy of a user's stored embedding, or None.
+        """
+        with self._lock:
+            row = self._rows.get(user_id)
+            if row is None:
+                return None
+            return self._matrix[row].copy()
+
+    def search(self, query, k: int = 1):
+        """
+        Return up to k (user_id, cosine_distance) pairs, closest first.
+        """
+        with self._lock:
+            if self._size == 0:
+                return []
+            q = self._normalize(query)
+            if q.shape[0] != self.dim:
+                logger.warning(f"Probe dimension {q.shape[0]} does not match gallery dimension {self.dim}")
+                return []
+            scores = self._matrix[:self._size] @ q
+            user_ids = self._user_ids[:self._size].copy()
+
+        k = min(k, scores.shape[0])
+        if k < scores.shape[0]:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(scores.shape[0])
+        top = top[np.argsort(-scores[top])]
+        return [(int(user_ids[i]), float(1 - scores[i])) for i in top]
+
+    def sync(self):
+        """
+        Nothing to pick up: this gallery lives in one process (see face_snapshot for the shared one).
+        """
+
+    def export(self):
+        """
+        Copies of the user ids and normalised rows, in row order.
+        """
+        with self._lock:
+            if self._size == 0:
+                return np.empty(0, dtype=np.int64), np.empty((0, self.dim or 0), dtype=np.float32)
+            return self._user_ids[:self._size].copy(), self._matrix[:self._size].copy()
+
+    def stats(self):
+        return {"shared": False, "size": self._size, "dim": self.dim}
+
+    def _upsert(self, user_id, embedding):
+        vector = self._normalize(embedding)
+        if self.dim is None:
+            self.dim = vector.shape[0]
+            self._matrix = np.empty((self.initial_capacity, self.dim), dtype=np.float32)
+            self._user_ids = np.empty(self.initial_capacity, dtype=np.int64)
+        elif vector.shape[0] != self.dim:
+            logger.warning(f"Skipping embedding for user {user_id}: dimension {vector.shape[0]} != {self.dim}")
+            return
+
+        row = self._rows.get(user_id)
+        if row is None:
+            if self._size == self._matrix.shape[0]:
+                self._grow()
+            row = self._size
+            self._size += 1
+            self._rows[user_id] = row
+            self._user_ids[row] = user_id
+        self._matrix[row] = vector
+
+    def _grow(self):
+        capacity = max(self.initial_capacity, self._matrix.shape[0] * 2)
+        matrix = np.empty((capacity, self.dim), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        user_ids = np.empty(capacity, dtype=np.int64)
+        user_ids[:self._size] = self._user_ids[:self._size]
+        self._matrix = matrix
+        self._user_ids = user_ids
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        if norm != 0:
+            vector = vector / norm
+        return vector
+
+
+def create_gallery():
+    """
+    The shared, file-backed gallery when EMBEDDING_STORE_DIR is set and the platform has flock.
+    """
+    if EMBEDDING_STORE_DIR:
+        from . import face_snapshot
+        if face_snapshot.supported():
+            return face_snapshot.SharedFaceGallery(EMBEDDING_STORE_DIR)
+        logger.warning("fcntl not available, face gallery is per process")
+    return FaceGallery()
+
+
+gallery = create_gallery()
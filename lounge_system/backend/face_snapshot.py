@@ -0,0 +1,426 @@
+import os
+import mmap
+import hashlib
+import time
+import struct
+import logging
+import threading
+from array import array
+from contextlib import contextmanager
+import numpy as np
+from sqlalchemy import LargeBinary, type_coerce
+from sqlalchemy.orm import Session
+from .database import SQLALCHEMY_DATABASE_URL
+from .face_index import FaceGallery
+from . import models
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, callers fall back to a per-process FaceGallery
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Config
+EMBEDDING_DELTA_COMPACT_RECORDS = int(os.getenv("EMBEDDING_DELTA_COMPACT_RECORDS", "1024"))
+OVERLAY_CAPACITY = 64
+
+# snapshot.f32: header padded to 64 bytes, then count x dim float32 rows (L2-normalised),
+# then count int64 user ids in ascending order
+#   magic(4s) format(H) reserved(H) generation(Q) count(Q) dim(I) source(8s) content(16s)
+# source identifies the database the snapshot was built from; content is a digest of the
+# face_embeddings rows it was built from (zeros for a compacted snapshot, whose rows came from the log)
+SNAPSHOT_MAGIC = b"LXFS"
+SNAPSHOT_HEADER = struct.Struct("<4sHHQQI8s16s")
+UNKNOWN_CONTENT = b"\0" * 16
+SNAPSHOT_DATA_OFFSET = 64
+
+# delta.log: header padded to 32 bytes, then appended records, each followed by dim float32 values
+#   header: magic(4s) format(H) reserved(H) generation(Q)  -- the snapshot generation it extends
+#   record: user_id(q) op(B) dim(H) pid(I)
+DELTA_MAGIC = b"LXDL"
+DELTA_HEADER = struct.Struct("<4sHHQ")
+DELTA_DATA_OFFSET = 32
+RECORD = struct.Struct("<qBHI")
+OP_UPSERT = 1
+OP_REMOVE = 2
+
+FORMAT = 2
+WRITE_CHUNK_ROWS = 4096
+SOURCE = hashlib.blake2b(SQLALCHEMY_DATABASE_URL.encode(), digest_size=8).digest()
+
+
+def supported() -> bool:
+    return fcntl is not None
+
+
+class SharedFaceGallery:
+    """
+    FaceGallery shared by every uvicorn worker through files in `directory`.
+
+    snapshot.f32 holds every embedding as one float32 matrix that each worker maps read-only,
+    so the pages live once in the OS page cache however many workers run. Registrations are
+    appended to delta.log; every worker tails it on each lookup (one stat call) and keeps the
+    few newer rows in a small private overlay. Once the log holds EMBEDDING_DELTA_COMPACT_RECORDS
+    records a background thread folds it into a new snapshot generation, which workers switch to
+    on their next lookup.
+
+    Writers (append, compaction, rebuild) serialise on an flock of `lock`; readers take no lock:
+    files are replaced with os.replace, never rewritten in place, and a delta log is only paired
+    with the snapshot generation recorded in its header.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.snapshot_path = os.path.join(directory, "snapshot.f32")
+        self.delta_path = os.path.join(directory, "delta.log")
+        self.lock_path = os.path.join(directory, "lock")
+        # Called with (user_id, embedding) for rows other workers append to the log; rows that reach
+        # this worker through a compacted snapshot instead are left to the listener's own refresh
+        self.listeners = []
+        self._lock = threading.RLock()
+        self._compacting = False
+        self._reset()
+
+    def _reset(self):
+        self.generation = None
+        self.source = None
+        self.content = None
+        self.dim = None
+        self._mmap = None
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._user_ids = np.empty(0, dtype=np.int64)
+        self._superseded = np.zeros(0, dtype=bool)  # snapshot rows replaced or removed by the log
+        self._overlay = FaceGallery(OVERLAY_CAPACITY)
+        self._delta = None  # open file object of the log being tailed
+        self._delta_ino = None
+        self._delta_offset = 0
+        self._delta_records = 0
+
+    def __len__(self):
+        with self._lock:
+            return int(self._user_ids.shape[0] - self._superseded.sum()) + len(self._overlay)
+
+    def load(self, db: Session):
+        """
+        Map the current snapshot only if it was built from exactly the face_embeddings rows the
+        table holds now (same database, same content digest, nothing in its delta log); otherwise
+        rebuild it. That covers faces enrolled or re-registered while the store was disabled, and
+        registrations logged before a restart, which are folded into one fresh snapshot.
+        Workers booting together rebuild once: the others find the fresh snapshot under the lock.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with self._file_lock():
+            content = content_digest(db)
+            if self._open() and self.source == SOURCE and self.content == content and not self._delta_records:
+                logger.info(f"Face snapshot generation {self.generation} mapped with {len(self)} embeddings")
+                return
+            self._rebuild(db, content)
+        logger.info(f"Face snapshot generation {self.generation} built with {len(self)} embeddings")
+
+    def upsert(self, user_id: int, embedding):
+        self._append(user_id, OP_UPSERT, FaceGallery._normalize(embedding))
+
+    def remove(self, user_id: int):
+        self._append(user_id, OP_REMOVE, np.empty(0, dtype=np.float32))
+
+    def get(self, user_id: int):
+        self.sync()
+        with self._lock:
+            vector = self._overlay.get(user_id)
+            if vector is not None:
+                return vector
+            row = self._row(user_id)
+            if row is None or self._superseded[row]:
+                return None
+            return self._matrix[row].copy()
+
+    def search(self, query, k: int = 1):
+        self.sync()
+        with self._lock:
+            matrix, user_ids, superseded, overlay = self._matrix, self._user_ids, self._superseded, self._overlay
+            dim = self.dim
+        q = FaceGallery._normalize(query)
+        if dim is not None and q.shape[0] != dim:
+            logger.warning(f"Probe dimension {q.shape[0]} does not match gallery dimension {dim}")
+            return []
+
+        matches = overlay.search(q, k)
+        if user_ids.shape[0]:
+            scores = matrix @ q
+            if superseded.any():
+                scores[superseded] = -np.inf
+            top = min(k, scores.shape[0])
+            top = np.argpartition(-scores, top - 1)[:top] if top < scores.shape[0] else np.arange(scores.shape[0])
+            matches.extend((int(user_ids[i]), float(1 - scores[i])) for i in top if scores[i] != -np.inf)
+        matches.sort(key=lambda match: match[1])
+        return matches[:k]
+
+    def sync(self):
+        """
+        Apply records other workers appended since the last call; switch to a newer snapshot
+        generation if the log was compacted. Costs one stat call when nothing changed.
+        """
+        try:
+            st = os.stat(self.delta_path)
+        except FileNotFoundError:
+            return
+        with self._lock:
+            if st.st_ino != self._delta_ino:
+                self._open()
+            elif st.st_size > self._delta_offset:
+                self._tail()
+
+    def compact(self):
+        """
+        Fold the delta log into a new snapshot generation.
+        """
+        with self._file_lock():
+            self.sync()
+            self._compact()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "shared": True,
+                "size": len(self),
+                "dim": self.dim,
+                "generation": self.generation,
+                "snapshot_rows": int(self._user_ids.shape[0]),
+                "delta_records": self._delta_records,
+            }
+
+    def _append(self, user_id, op, vector):
+        if self.generation is None:
+            # Not loaded (startup failed or never ran): keep the change in this process only
+            with self._lock:
+                self._apply(user_id, op, vector)
+            return
+        record = RECORD.pack(user_id, op, vector.shape[0], os.getpid()) + vector.astype("<f4", copy=False).tobytes()
+        with self._file_lock():
+            fd = os.open(self.delta_path, os.O_WRONLY | os.O_APPEND)
+            try:
+                os.write(fd, record)
+            finally:
+                os.close(fd)
+            self.sync()
+            compact = self._delta_records >= EMBEDDING_DELTA_COMPACT_RECORDS and not self._compacting
+            if compact:
+                self._compacting = True
+        if compact:
+            threading.Thread(target=self._compact_in_background, name="face-snapshot-compaction", daemon=True).start()
+
+    def _compact_in_background(self):
+        try:
+            self.compact()
+        except Exception as e:
+            logger.error(f"Face snapshot compaction failed: {e}")
+        finally:
+            self._compacting = False
+
+    def _open(self) -> bool:
+        """
+        Map the snapshot and replay its delta log from the start. Returns False (keeping the
+        current state) if the files are missing, unreadable or caught mid-compaction.
+        """
+        try:
+            delta = open(self.delta_path, "rb")
+        except FileNotFoundError:
+            return False
+        try:
+            magic, fmt, _, delta_generation = DELTA_HEADER.unpack(delta.read(DELTA_HEADER.size))
+            with open(self.snapshot_path, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            snapshot_magic, snapshot_fmt, _, generation, count, dim, source, content = SNAPSHOT_HEADER.unpack_from(mapped)
+        except (OSError, ValueError, struct.error) as e:
+            delta.close()
+            logger.warning(f"Face snapshot unreadable: {e}")
+            return False
+        if (magic, snapshot_magic) != (DELTA_MAGIC, SNAPSHOT_MAGIC) or (fmt, snapshot_fmt) != (FORMAT, FORMAT):
+            delta.close()
+            logger.warning("Face snapshot has an unknown format")
+            return False
+        if delta_generation != generation:
+            # Between the two renames of a compaction; the next lookup retries
+            delta.close()
+            return False
+
+        matrix_bytes = count * dim * 4
+        ids_offset = _align8(SNAPSHOT_DATA_OFFSET + matrix_bytes)
+        with self._lock:
+            if self._delta is not None:
+                self._delta.close()
+            self._reset()
+            self.generation = generation
+            self.source = source
+            self.content = content
+            self.dim = dim or None
+            self._mmap = mapped
+            self._matrix = np.frombuffer(mapped, dtype="<f4", count=count * dim, offset=SNAPSHOT_DATA_OFFSET).reshape(count, dim)
+            self._user_ids = np.frombuffer(mapped, dtype="<i8", count=count, offset=ids_offset)
+            self._superseded = np.zeros(count, dtype=bool)
+            self._delta = delta
+            self._delta_ino = os.fstat(delta.fileno()).st_ino
+            self._delta_offset = DELTA_DATA_OFFSET
+            self._tail(notify=False)
+        return True
+
+    def _tail(self, notify: bool = True):
+        # Caller holds self._lock
+        self._delta.seek(self._delta_offset)
+        data = self._delta.read()
+        position = 0
+        pid = os.getpid()
+        while position + RECORD.size <= len(data):
+            user_id, op, dim, writer = RECORD.unpack_from(data, position)
+            end = position + RECORD.size + dim * 4
+            if end > len(data):
+                break  # record still being written
+            vector = np.frombuffer(data, dtype="<f4", count=dim, offset=position + RECORD.size).copy()
+            position = end
+            self._delta_records += 1
+            if not self._apply(user_id, op, vector):
+                continue
+            if notify and writer != pid and op == OP_UPSERT:
+                for listener in self.listeners:
+                    listener(user_id, vector)
+        self._delta_offset += position
+
+    def _apply(self, user_id, op, vector) -> bool:
+        # Caller holds self._lock
+        if op == OP_UPSERT:
+            if self.dim is None:
+                self.dim = vector.shape[0]
+            elif vector.shape[0] != self.dim:
+                logger.warning(f"Skipping embedding for user {user_id}: dimension {vector.shape[0]} != {self.dim}")
+                return False
+        row = self._row(user_id)
+        if row is not None:
+            self._superseded[row] = True
+        if op == OP_UPSERT:
+            self._overlay.upsert(user_id, vector)
+        else:
+            self._overlay.remove(user_id)
+        return True
+
+    def _row(self, user_id):
+        row = int(np.searchsorted(self._user_ids, user_id))
+        if row < self._user_ids.shape[0] and self._user_ids[row] == user_id:
+            return row
+        return None
+
+    def _rebuild(self, db: Session, content: bytes):
+        # Caller holds the file lock
+        rows = db.query(models.FaceEmbedding.user_id, models.FaceEmbedding.embedding).filter(
+            models.FaceEmbedding.embedding.isnot(None)
+        ).order_by(models.FaceEmbedding.user_id).yield_per(WRITE_CHUNK_ROWS)
+
+        def chunks():
+            user_ids, vectors = [], []
+            for user_id, embedding in rows:
+                if user_ids and user_ids[-1] == user_id:
+                    continue
+                user_ids.append(user_id)
+                vectors.append(FaceGallery._normalize(embedding))
+                if len(user_ids) == WRITE_CHUNK_ROWS:
+                    yield user_ids, vectors
+                    user_ids, vectors = [], []
+            if user_ids:
+                yield user_ids, vectors
+
+        self._write(chunks(), content)
+
+    def _compact(self):
+        # Caller holds the file lock and has synced
+        with self._lock:
+            matrix, user_ids, keep = self._matrix, self._user_ids, ~self._superseded
+            overlay_ids, overlay_matrix = self._overlay.export()
+        started = time.perf_counter()
+        base_rows = np.flatnonzero(keep)
+        merged_ids = np.concatenate([user_ids[base_rows], overlay_ids])
+        order = np.argsort(merged_ids, kind="stable")
+        base_count = base_rows.shape[0]
+
+        def chunks():
+            for start in range(0, order.shape[0], WRITE_CHUNK_ROWS):
+                picks = order[start:start + WRITE_CHUNK_ROWS]
+                from_base = picks < base_count
+                vectors = np.empty((picks.shape[0], self.dim or 0), dtype=np.float32)
+                if from_base.any():
+                    vectors[from_base] = matrix[base_rows[picks[from_base]]]
+                if not from_base.all():
+                    vectors[~from_base] = overlay_matrix[picks[~from_base] - base_count]
+                yield merged_ids[picks].tolist(), vectors
+
+        self._write(chunks(), UNKNOWN_CONTENT)
+        logger.info(
+            f"Face snapshot compacted into generation {self.generation} "
+            f"({len(self)} embeddings, {round((time.perf_counter() - started) * 1000, 1)} ms)"
+        )
+
+    def _write(self, chunks, content: bytes):
+        """
+        Write a new snapshot generation from (user_ids, vectors) chunks in ascending user id
+        order, start an empty delta log for it and switch to it. Caller holds the file lock.
+        """
+        generation = (self._read_generation() or 0) + 1
+        tmp = self.snapshot_path + ".tmp"
+        user_ids = array("q")
+        dim = 0
+        with open(tmp, "wb") as f:
+            f.write(b"\0" * SNAPSHOT_DATA_OFFSET)
+            for ids, vectors in chunks:
+                vectors = np.asarray(vectors, dtype="<f4")
+                dim = dim or vectors.shape[1]
+                f.write(vectors.tobytes())
+                user_ids.extend(ids)
+            f.write(b"\0" * (_align8(f.tell()) - f.tell()))
+            f.write(np.asarray(user_ids, dtype="<i8").tobytes())
+            f.seek(0)
+            f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, FORMAT, 0, generation, len(user_ids), dim, SOURCE, content))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_path)
+
+        tmp = self.delta_path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(DELTA_HEADER.pack(DELTA_MAGIC, FORMAT, 0, generation).ljust(DELTA_DATA_OFFSET, b"\0"))
+        os.replace(tmp, self.delta_path)
+        self._open()
+
+    def _read_generation(self):
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                return SNAPSHOT_HEADER.unpack(f.read(SNAPSHOT_HEADER.size))[3]
+        except (OSError, struct.error):
+            return None
+
+    @contextmanager
+    def _file_lock(self):
+        # A fresh descriptor per acquisition, so threads of one process exclude each other too
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+
+def content_digest(db: Session) -> bytes:
+    """
+    Digest of every face_embeddings row (user id and stored blob, not decoded), so a row
+    re-registered in place changes it even though the row count does not.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    blob = type_coerce(models.FaceEmbedding.embedding, LargeBinary)
+    rows = db.query(models.FaceEmbedding.user_id, blob).filter(
+        models.FaceEmbedding.embedding.isnot(None)
+    ).order_by(models.FaceEmbedding.user_id, models.FaceEmbedding.id).yield_per(WRITE_CHUNK_ROWS)
+    for user_id, data in rows:
+        digest.update(struct.pack("<qI", user_id, len(data)))
+        digest.update(data)
+    return digest.digest()
+
+
+def _align8(offset: int) -> int:
+    return (offset + 7) & ~7
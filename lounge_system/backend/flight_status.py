@@ -0,0 +1,228 @@
+import os
+import re
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+# Config
+FLIGHT_PROVIDER = os.getenv("FLIGHT_PROVIDER", "stub")  # "stub" (demo data) or "http"
+# e.g. https://flights.example.com/v1/status/{flight_number}
+FLIGHT_API_URL = os.getenv("FLIGHT_API_URL", "http://localhost:9000/flights/{flight_number}")
+FLIGHT_API_KEY = os.getenv("FLIGHT_API_KEY")
+FLIGHT_CACHE_TTL = float(os.getenv("FLIGHT_CACHE_TTL", "60"))  # fresh for this long
+FLIGHT_STALE_TTL = float(os.getenv("FLIGHT_STALE_TTL", "1800"))  # then served while refreshing, up to this age
+FLIGHT_TIMEOUT = float(os.getenv("FLIGHT_TIMEOUT", "2"))  # seconds a request waits for the provider
+FLIGHT_MAX_CONNECTIONS = int(os.getenv("FLIGHT_MAX_CONNECTIONS", "20"))
+FLIGHT_CACHE_SIZE = 10_000
+
+FLIGHT_NUMBER = re.compile(r"^[A-Z0-9]{2,3}[0-9]{1,5}[A-Z]?$")
+FIELDS = ("flight_number", "destination", "gate", "status", "departure_time")
+
+
+class FlightUnavailable(Exception):
+    """
+    Raised when the provider fails or times out and nothing usable is cached; callers should answer 503.
+    """
+
+
+def normalize_flight_number(flight_number: str):
+    """
+    "ai 101" -> "AI101"; None if it does not look like a flight number.
+    """
+    normalized = "".join(flight_number.split()).upper()
+    return normalized if FLIGHT_NUMBER.match(normalized) else None
+
+
+class StubProvider:
+    """
+    Demo data, no network: every flight leaves for London in three hours.
+    """
+
+    async def fetch(self, flight_number: str) -> dict:
+        return {
+            "flight_number": flight_number,
+            "destination": "London (LHR)",
+            "gate": "B12",
+            "status": "On Time",
+            "departure_time": (datetime.now() + timedelta(hours=3)).strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+
+    async def close(self):
+        pass
+
+
+class HTTPProvider:
+    """
+    Flight-data provider over HTTP with a pooled, keep-alive httpx client.
+    The response must be a JSON object carrying the FIELDS; anything else is dropped.
+    transport lets the client be pointed at an in-process stand-in (see lounge_system.bench.flight_provider).
+    """
+
+    def __init__(self, url: str, api_key: str = None, timeout: float = FLIGHT_TIMEOUT,
+                 max_connections: int = FLIGHT_MAX_CONNECTIONS, transport=None):
+        import httpx
+
+        self.url = url
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self._client = httpx.AsyncClient(
+            headers=headers,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            transport=transport,
+        )
+
+    async def fetch(self, flight_number: str) -> dict:
+        response = await self._client.get(self.url.format(flight_number=flight_number))
+        response.raise_for_status()
+        data = response.json()
+        return {field: data.get(field) for field in FIELDS} | {"flight_number": flight_number}
+
+    async def close(self):
+        await self._client.aclose()
+
+
+def create_provider():
+    if FLIGHT_PROVIDER == "http":
+        return HTTPProvider(FLIGHT_API_URL, FLIGHT_API_KEY)
+    return StubProvider()
+
+
+class FlightStatusClient:
+    """
+    Cached, coalescing front for a flight-data provider.
+
+    - Fresh entries (younger than ttl) are answered from memory.
+    - Concurrent misses for one flight share a single upstream call (single flight), so a
+      departure board refresh by 200 passengers of one flight costs one provider request.
+    - Entries past ttl but within stale_ttl are answered immediately while one background
+      refresh runs (stale-while-revalidate).
+    - Otherwise the caller waits at most timeout for the provider; if it fails or is too slow,
+      whatever is still cached is served marked stale, and only with nothing cached is it an error.
+
+    Only touched from the event loop, except prefetch(), which sync routes call from their thread.
+    """
+
+    def __init__(self, provider, ttl: float, stale_ttl: float, timeout: float, max_size: int = FLIGHT_CACHE_SIZE):
+        self.provider = provider
+        self.ttl = ttl
+        self.stale_ttl = max(ttl, stale_ttl)
+        self.timeout = timeout
+        self.max_size = max_size
+        self._entries = OrderedDict()  # flight_number -> (data, fetched_at)
+        self._inflight = {}  # flight_number -> asyncio.Task
+        self._loop = None
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.upstream_calls = 0
+        self.upstream_errors = 0
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+
+    async def close(self):
+        for task in list(self._inflight.values()):
+            task.cancel()
+        await self.provider.close()
+
+    async def get(self, flight_number: str) -> dict:
+        """
+        Status of a (normalized) flight number, with "fetched_at" and "stale" added.
+        """
+        entry = self._entries.get(flight_number)
+        age = time.monotonic() - entry[1] if entry else None
+        if entry and age < self.ttl:
+            self.hits += 1
+            self._entries.move_to_end(flight_number)
+            return self._response(entry, stale=False)
+        if entry and age < self.stale_ttl:
+            self.stale_hits += 1
+            self._refresh(flight_number)
+            return self._response(entry, stale=True)
+
+        self.misses += 1
+        task = self._refresh(flight_number)
+        try:
+            # Shielded: one caller timing out must not cancel the call others are waiting on
+            await asyncio.wait_for(asyncio.shield(task), self.timeout)
+        except Exception as e:
+            entry = self._entries.get(flight_number)
+            if entry is None:
+                raise FlightUnavailable(str(e) or type(e).__name__)
+            self.stale_hits += 1
+            return self._response(entry, stale=True)
+        return self._response(self._entries[flight_number], stale=False)
+
+    def prefetch(self, flight_number: str):
+        """
+        Warm the cache in the background (e.g. at booking time). Safe from any thread.
+        """
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            on_loop = asyncio.get_running_loop() is loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._prefetch(flight_number)
+        else:
+            loop.call_soon_threadsafe(self._prefetch, flight_number)
+
+    def stats(self):
+        return {
+            "provider": type(self.provider).__name__,
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "upstream_calls": self.upstream_calls,
+            "upstream_errors": self.upstream_errors,
+        }
+
+    def _prefetch(self, flight_number: str):
+        entry = self._entries.get(flight_number)
+        if entry is None or time.monotonic() - entry[1] >= self.ttl:
+            self._refresh(flight_number)
+
+    def _refresh(self, flight_number: str) -> asyncio.Task:
+        """
+        The in-flight upstream call for this flight, started if there is none.
+        """
+        task = self._inflight.get(flight_number)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(flight_number))
+            self._inflight[flight_number] = task
+            task.add_done_callback(lambda done: self._done(flight_number, done))
+        return task
+
+    def _done(self, flight_number: str, task: asyncio.Task):
+        self._inflight.pop(flight_number, None)
+        if not task.cancelled():
+            task.exception()  # logged in _fetch; background refreshes have no one awaiting them
+
+    async def _fetch(self, flight_number: str):
+        self.upstream_calls += 1
+        try:
+            data = await self.provider.fetch(flight_number)
+        except Exception as e:
+            self.upstream_errors += 1
+            logger.warning(f"Flight provider failed for {flight_number}: {e}")
+            raise
+        self._entries[flight_number] = (data, time.monotonic())
+        self._entries.move_to_end(flight_number)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _response(self, entry, stale: bool) -> dict:
+        data, fetched_at = entry
+        fetched = datetime.utcnow() - timedelta(seconds=time.monotonic() - fetched_at)
+        return dict(data, fetched_at=fetched.strftime("%Y-%m-%dT%H:%M:%SZ"), stale=stale)
+
+
+client = FlightStatusClient(create_provider(), FLIGHT_CACHE_TTL, FLIGHT_STALE_TTL, FLIGHT_TIMEOUT)
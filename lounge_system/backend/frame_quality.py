@@ -0,0 +1,94 @@
+import os
+import time
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Config
+FACE_QUALITY_CHECK = os.getenv("FACE_QUALITY_CHECK", "1") == "1"
+QUALITY_SIDE = 320  # longest side of the grayscale copy that is scored
+QUALITY_MIN_SHARPNESS = float(os.getenv("QUALITY_MIN_SHARPNESS", "25"))  # variance of the Laplacian
+QUALITY_MIN_BRIGHTNESS = float(os.getenv("QUALITY_MIN_BRIGHTNESS", "40"))  # mean gray level, 0-255
+QUALITY_MAX_BRIGHTNESS = float(os.getenv("QUALITY_MAX_BRIGHTNESS", "220"))
+QUALITY_MIN_FACE_PX = int(os.getenv("QUALITY_MIN_FACE_PX", "64"))  # face width in the uploaded image
+
+# Rejection codes (returned to clients like express_entry decision codes)
+TOO_BLURRY = "too_blurry"
+TOO_DARK = "too_dark"
+TOO_BRIGHT = "too_bright"
+FACE_TOO_SMALL = "face_too_small"
+
+_cascade = None  # False once we know this OpenCV build has no Haar cascades (OpenCV 5 moved them out)
+
+
+class PoorFrame(ValueError):
+    """
+    Raised in the API process for a scan the quality check rejected; code is one of the
+    rejection codes above, reason is shown to the passenger.
+    """
+
+    def __init__(self, code: str, reason: str):
+        super().__init__(reason)
+        self.code = code
+        self.reason = reason
+
+
+def _face_cascade():
+    """
+    Load OpenCV's frontal-face Haar cascade once per process; None if this build lacks it.
+    """
+    global _cascade
+    if _cascade is None:
+        import cv2
+        if hasattr(cv2, "CascadeClassifier"):
+            _cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+        else:
+            logger.warning("OpenCV has no Haar cascades, face size is not checked")
+            _cascade = False
+    return _cascade or None
+
+
+def assess(img):
+    """
+    Score a decoded BGR frame on a small grayscale copy, in a few milliseconds.
+    Returns (code, reason, scores); code is None when the frame is good enough for ArcFace.
+
+    Sharpness and brightness are measured on the largest face the Haar cascade finds, or on the
+    whole frame when it finds none; the cascade misses faces the real detector catches, so
+    "no face" is left to DeepFace rather than rejected here.
+    """
+    import cv2
+
+    start = time.perf_counter()
+    height, width = img.shape[:2]
+    scale = min(1.0, QUALITY_SIDE / max(height, width))
+    small = img
+    if scale < 1:
+        small = cv2.resize(img, (max(1, int(width * scale)), max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+
+    cascade = _face_cascade()
+    faces = cascade.detectMultiScale(gray, scaleFactor=1.2, minNeighbors=4, minSize=(16, 16)) if cascade else ()
+    region = gray
+    face_px = None
+    if len(faces):
+        x, y, w, h = max(faces, key=lambda face: face[2] * face[3])
+        region = gray[y:y + h, x:x + w]
+        face_px = int(round(w / scale))
+
+    scores = {
+        "sharpness": round(float(cv2.Laplacian(region, cv2.CV_64F).var()), 1),
+        "brightness": round(float(np.mean(region)), 1),
+        "face_px": face_px,
+        "ms": round((time.perf_counter() - start) * 1000, 3),
+    }
+    if scores["brightness"] < QUALITY_MIN_BRIGHTNESS:
+        return TOO_DARK, "Image too dark, please face the light", scores
+    if scores["brightness"] > QUALITY_MAX_BRIGHTNESS:
+        return TOO_BRIGHT, "Image overexposed, please step out of direct light", scores
+    if face_px is not None and face_px < QUALITY_MIN_FACE_PX:
+        return FACE_TOO_SMALL, "Face too small, please step closer to the camera", scores
+    if scores["sharpness"] < QUALITY_MIN_SHARPNESS:
+        return TOO_BLURRY, "Image too blurry, please hold still", scores
+    return None, None, scores
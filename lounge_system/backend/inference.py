@@ -0,0 +1,229 @@
+import os
+import asyncio
+import logging
+import threading
+import time
+import hashlib
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from . import face_logic, metrics
+
+logger = logging.getLogger(__name__)
+
+# Config
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "1"))
+INFERENCE_QUEUE_SIZE = int(os.getenv("INFERENCE_QUEUE_SIZE", "16"))  # max jobs queued or running
+INFERENCE_TIMEOUT = float(os.getenv("INFERENCE_TIMEOUT", "30"))  # seconds per job
+INFERENCE_BATCH_WINDOW_MS = float(os.getenv("INFERENCE_BATCH_WINDOW_MS", "5"))  # how long to gather concurrent scans
+INFERENCE_MAX_BATCH = int(os.getenv("INFERENCE_MAX_BATCH", "8"))
+RETRY_AFTER_SECONDS = 2
+# Kiosks re-send the same frame after a client timeout; 0 disables the result cache
+FACE_RESULT_CACHE_TTL = float(os.getenv("FACE_RESULT_CACHE_TTL", "30"))
+FACE_RESULT_CACHE_SIZE = int(os.getenv("FACE_RESULT_CACHE_SIZE", "512"))
+
+
+class InferenceBusy(Exception):
+    """
+    Raised when the inference queue is full; callers should answer 503.
+    """
+
+
+class InferenceTimeout(Exception):
+    """
+    Raised when a job does not finish within INFERENCE_TIMEOUT.
+    """
+
+
+def _init_worker():
+    # Every worker process builds and warms its own model before taking jobs
+    face_logic.load_model()
+
+
+class InferencePool:
+    """
+    Process pool that runs face inference away from the event loop.
+
+    Each worker holds its own ArcFace model. Admission is bounded: once
+    queue_size jobs are queued or running, new jobs are refused with
+    InferenceBusy instead of piling up behind the gate.
+    """
+
+    def __init__(self, workers: int, queue_size: int, timeout: float):
+        self.workers = max(1, workers)
+        self.queue_size = max(self.workers, queue_size)
+        self.timeout = timeout
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.ready = False
+        self.warmup_ms = None
+        self.worker_status = []
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def start(self):
+        if self._executor is None:
+            # spawn, not fork: TensorFlow does not survive being forked with live threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+            logger.info(f"Inference pool started with {self.workers} workers")
+
+    async def warm_up(self):
+        """
+        Spawn every worker and wait until each one has its model built and warmed.
+        """
+        self.start()
+        start = time.perf_counter()
+        futures = [self._executor.submit(face_logic.load_model) for _ in range(self.workers)]
+        statuses = await asyncio.gather(*(asyncio.wrap_future(f) for f in futures))
+        self.worker_status = list({status["pid"]: status for status in statuses}.values())
+        self.warmup_ms = round((time.perf_counter() - start) * 1000, 1)
+        self.ready = True
+        logger.info(f"Inference pool warm after {self.warmup_ms} ms")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+            self.ready = False
+
+    async def run(self, fn, *args):
+        """
+        Run fn(*args) in a worker and await its result.
+        """
+        with self._lock:
+            if self._pending >= self.queue_size:
+                raise InferenceBusy()
+            self._pending += 1
+
+        try:
+            self.start()
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._release()
+            raise
+        # The slot is held until the worker is really done, even if the caller gave up
+        future.add_done_callback(lambda _: self._release())
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            raise InferenceTimeout()
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM); start a fresh pool on the next job
+            logger.error("Inference worker died, restarting pool")
+            self._executor = None
+            raise InferenceBusy()
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+
+
+class MicroBatcher:
+    """
+    Merges single-image embedding requests that arrive within a few milliseconds
+    into one face_logic.get_embeddings job, so concurrent gate scans share a forward pass.
+    """
+
+    def __init__(self, pool: InferencePool, window_ms: float, max_batch: int):
+        self.pool = pool
+        self.window = window_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self._items = []
+        self._timer = None
+
+    async def embed(self, image):
+        """
+        Return {"embedding": ..., "error": ...} for one image.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._items.append((image, future))
+        if len(self._items) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        items, self._items = self._items, []
+        if items:
+            asyncio.ensure_future(self._run(items))
+
+    async def _run(self, items):
+        if metrics.METRICS_ENABLED:
+            metrics.FACE_BATCH_SIZE.observe(len(items))
+        try:
+            results = await self.pool.run(face_logic.get_embeddings, [image for image, _ in items])
+        except Exception as e:
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(items, results):
+            if not future.done():
+                future.set_result(result)
+
+
+class ResultCache:
+    """
+    Short-TTL cache of face job results keyed by a hash of the upload bytes, so an exact
+    resubmission gets the earlier embedding (or quality rejection) without another forward pass.
+    A frame still being processed is shared with the resubmission instead of queued twice.
+    Failed jobs (busy, timeout) are not kept. Only used from the event loop, so no lock.
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # digest -> (task, expires_at)
+        self.hits = 0
+        self.misses = 0
+
+    async def get_or_run(self, image: bytes, run):
+        """
+        Return (result, cached) where result is what run(image) returns.
+        """
+        if self.ttl <= 0:
+            return await run(image), False
+
+        key = hashlib.blake2b(image, digest_size=16).digest()
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] > now:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return await asyncio.shield(entry[0]), True
+
+        self.misses += 1
+        task = asyncio.ensure_future(run(image))
+        self._entries[key] = (task, now + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        task.add_done_callback(lambda done: self._forget_failed(key, done))
+        # Shielded: a caller that gives up must not cancel the job for others waiting on it
+        return await asyncio.shield(task), False
+
+    def _forget_failed(self, key, task):
+        if task.cancelled() or task.exception() is not None:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is task:
+                del self._entries[key]
+
+
+pool = InferencePool(INFERENCE_WORKERS, INFERENCE_QUEUE_SIZE, INFERENCE_TIMEOUT)
+batcher = MicroBatcher(pool, INFERENCE_BATCH_WINDOW_MS, INFERENCE_MAX_BATCH)
+results = ResultCache(FACE_RESULT_CACHE_TTL, FACE_RESULT_CACHE_SIZE)
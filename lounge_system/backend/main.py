@@ -1,14 +1,29 @@
-from fastapi import FastAPI
+import time
+_boot_started = time.perf_counter()
+
+import os
+import sys
+import asyncio
+from fastapi import Depends, FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from .database import engine, Base, SessionLocal
-from .routes import auth_routes, face_routes, lounge_routes, admin_routes
-from . import models, auth
+from fastapi.responses import JSONResponse, PlainTextResponse
+from .database import engine, SessionLocal
+from .routes import auth_routes, face_routes, lounge_routes, admin_routes, event_routes
+from . import models, auth, inference, passwords, migrations, stats, entry_log, events, arrivals, catalog, metrics, flight_status, archive
+from .face_index import gallery
 import logging
 
+logger = logging.getLogger(__name__)
+
+# Config
+FACE_PRELOAD = os.getenv("FACE_PRELOAD", "1") == "1"  # build and warm ArcFace at startup
+
 # Initialize Database
-Base.metadata.create_all(bind=engine)
+migrations.upgrade(engine)
 
 app = FastAPI(title="Smart AI Lounge Entry System")
+app.state.startup_ms = None
+app.state.warmup_error = None
 
 # CORS
 app.add_middleware(
@@ -19,17 +34,43 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Instrumentation (nothing is installed when METRICS_ENABLED=0)
+if metrics.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+    metrics.instrument_engine(engine)
+    metrics.register_gauges("lounge_inference_pending", "Face jobs queued or running", lambda: {(): inference.pool.pending})
+    metrics.register_gauges("lounge_password_pending", "Password hashes queued or running", lambda: {(): passwords.pool.stats()["pending"]})
+    metrics.register_gauges("lounge_entry_log_queue_depth", "Entry logs waiting for the writer", lambda: {(): entry_log.writer.queue_depth})
+    metrics.register_counters("lounge_entry_logs_written", "Entry logs by writer outcome", lambda: {("written",): entry_log.writer.written, ("failed",): entry_log.writer.failed, ("dropped",): entry_log.writer.dropped}, ["outcome"])
+    metrics.register_counters("lounge_flight_upstream_calls", "Requests sent to the flight-data provider", lambda: {("ok",): flight_status.client.upstream_calls - flight_status.client.upstream_errors, ("error",): flight_status.client.upstream_errors}, ["outcome"])
+    metrics.register_counters("lounge_entry_logs_archived", "Entry logs moved to archive segments since start", lambda: {(): archive.archiver.archived})
+    metrics.register_gauges("lounge_event_subscribers", "Open live event streams", lambda: {(): events.hub.stats()["subscribers"]})
+    metrics.register_counters(
+        "lounge_cache_lookups", "Cache hits and misses",
+        lambda: {
+            ("principal", "hit"): auth.principal_cache.hits, ("principal", "miss"): auth.principal_cache.misses,
+            ("catalog", "hit"): catalog.cache.hits, ("catalog", "miss"): catalog.cache.misses,
+            ("face_result", "hit"): inference.results.hits, ("face_result", "miss"): inference.results.misses,
+            ("flight", "hit"): flight_status.client.hits, ("flight", "stale"): flight_status.client.stale_hits,
+            ("flight", "miss"): flight_status.client.misses,
+        },
+        ["cache", "result"],
+    )
+
 # Routes
 app.include_router(auth_routes.router)
 app.include_router(face_routes.router)
 app.include_router(lounge_routes.router)
 app.include_router(admin_routes.router)
+app.include_router(event_routes.router)
 
 @app.on_event("startup")
 async def startup_event():
     # Seed Initial Data if empty
     db = SessionLocal()
     try:
+        stats.rebuild_if_empty(db)
+
         if db.query(models.Lounge).count() == 0:
             # Create Lounges
             delhi_lounge = models.Lounge(name="Luxe Elite Lounge", airport="IGI Delhi (T3)", total_seats=50)
@@ -85,10 +126,89 @@ async def startup_event():
                 role="admin"
             )
             db.add(admin_user)
+            stats.record(db, stats.USERS)
             db.commit()
+
+        # Map (or build) the face gallery; with EMBEDDING_STORE_DIR it is shared by every worker
+        gallery.load(db)
+        # Today's (and tomorrow's) expected passengers per lounge
+        arrivals.expected.refresh(db)
     finally:
         db.close()
 
+    if hasattr(gallery, "listeners"):
+        # Faces enrolled through other workers also join today's expected arrivals here
+        gallery.listeners.append(arrivals.expected.note_face)
+
+    inference.pool.start()
+    passwords.pool.start()
+    entry_log.writer.start()
+    arrivals.expected.start()
+    # Moves entry logs past the hot window into compressed segments, first pass right away
+    archive.archiver.start()
+    flight_status.client.start()
+    if FACE_PRELOAD:
+        app.state.warmup_task = asyncio.create_task(warm_up_face_model())
+    app.state.startup_ms = round((time.perf_counter() - _boot_started) * 1000, 1)
+
+async def warm_up_face_model():
+    try:
+        await inference.pool.warm_up()
+    except Exception as e:
+        app.state.warmup_error = str(e)
+        logger.error(f"Face model warm-up failed: {e}")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await flight_status.client.close()
+    events.hub.close()
+    arrivals.expected.shutdown()
+    archive.archiver.shutdown()
+    await asyncio.to_thread(entry_log.writer.shutdown)  # flushes and joins the writer thread
+    inference.pool.shutdown()
+    passwords.pool.shutdown()
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to Smart AI Lounge Entry API", "status": "running"}
+
+@app.get("/ready")
+def readiness():
+    """
+    Readiness probe: 200 once the face model is warm in every inference worker.
+    """
+    ready = inference.pool.ready or not FACE_PRELOAD
+    body = {
+        "ready": ready,
+        "startup_ms": app.state.startup_ms,
+        # The API process itself never imports the TensorFlow stack
+        "deepface_imported": "deepface" in sys.modules,
+        "face_model": {
+            "preload": FACE_PRELOAD,
+            "warmup_ms": inference.pool.warmup_ms,
+            "workers": inference.pool.worker_status,
+            "error": app.state.warmup_error,
+        },
+        "face_gallery": gallery.stats(),
+        "arrivals": arrivals.expected.stats(),
+    }
+    return JSONResponse(body, status_code=200 if ready else 503)
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """
+    Prometheus text exposition of request, stage, DB and pool metrics.
+    """
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/profiles/{profile_id}")
+def request_profile(profile_id: str, current_user: auth.Principal = Depends(auth.get_admin_user)):
+    """
+    Collapsed stacks sampled during a request sent with "X-Profile: 1" (needs METRICS_PROFILING=1).
+    """
+    profile = metrics.get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
@@ -0,0 +1,333 @@
+import os
+import sys
+import asyncio
+import time
+import uuid
+import bisect
+import logging
+import threading
+from collections import Counter as _Tally, OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Config
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_PROFILING = os.getenv("METRICS_PROFILING", "0") == "1"  # honour the X-Profile request header
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_HISTORY = 50  # profiles kept for GET /metrics/profiles/{id}
+PROFILE_HEADER = b"x-profile"
+
+# Seconds; tuned for a gate where a face scan is ~10 ms-1 s and a DB query ~0.1-10 ms
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def _labels(self, labelvalues, extra=None):
+        pairs = list(zip(self.labelnames, labelvalues))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+class Counter(_Metric):
+    """
+    Incremented here, or read at scrape time from a callback returning running totals.
+    """
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback  # () -> {labelvalues: value}
+
+    def inc(self, *labelvalues, amount: float = 1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def render(self):
+        lines = self._header()
+        if self.callback is not None:
+            try:
+                items = list(self.callback().items())
+            except Exception as e:
+                logger.warning(f"Counter {self.name} callback failed: {e}")
+                items = []
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        for labelvalues, value in items:
+            lines.append(f"{self.name}_total{self._labels(labelvalues)} {_number(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """
+    Set directly, moved with inc/dec, or read at scrape time from a callback.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback  # () -> {labelvalues: value}
+
+    def set(self, value: float, *labelvalues):
+        with self._lock:
+            self._values[labelvalues] = value
+
+    def inc(self, *labelvalues, amount: float = 1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def dec(self, *labelvalues, amount: float = 1):
+        self.inc(*labelvalues, amount=-amount)
+
+    def render(self):
+        lines = self._header()
+        if self.callback is not None:
+            try:
+                items = list(self.callback().items())
+            except Exception as e:
+                logger.warning(f"Gauge {self.name} callback failed: {e}")
+                items = []
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        for labelvalues, value in items:
+            lines.append(f"{self.name}{self._labels(labelvalues)} {_number(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labelvalues)
+            if state is None:
+                # per-bucket counts (last slot is +Inf), sum
+                state = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            items = [(labelvalues, list(counts), total) for labelvalues, (counts, total) in self._values.items()]
+        for labelvalues, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                lines.append(f"{self.name}_bucket{self._labels(labelvalues, ('le', le))} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(labelvalues)} {_number(total)}")
+            lines.append(f"{self.name}_count{self._labels(labelvalues)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUESTS = registry.register(Counter("lounge_http_requests", "HTTP requests handled", ["method", "route", "status"]))
+HTTP_DURATION = registry.register(Histogram("lounge_http_request_duration_seconds", "HTTP request latency", ["method", "route"]))
+HTTP_IN_FLIGHT = registry.register(Gauge("lounge_http_requests_in_flight", "HTTP requests being served"))
+STAGE_DURATION = registry.register(Histogram("lounge_stage_duration_seconds", "Time spent in each hot-path stage", ["stage"]))
+DB_QUERY_DURATION = registry.register(Histogram("lounge_db_query_duration_seconds", "SQL statement latency", ["statement"]))
+FACE_BATCH_SIZE = registry.register(Histogram("lounge_face_batch_size", "Images per ArcFace forward pass", buckets=(1, 2, 4, 8, 16, 32, 64)))
+ENTRY_DECISIONS = registry.register(Counter("lounge_entry_decisions", "Gate decisions by outcome code", ["code"]))
+
+
+def observe_stage(stage: str, seconds: float):
+    if METRICS_ENABLED:
+        STAGE_DURATION.observe(seconds, stage)
+
+def observe_stages(timings_ms: dict, prefix: str = ""):
+    """
+    Record a {stage: milliseconds} dict such as express_entry.Decision.timings.
+    """
+    if METRICS_ENABLED and timings_ms:
+        for stage, ms in timings_ms.items():
+            STAGE_DURATION.observe(ms / 1000, prefix + stage)
+
+def register_gauges(name: str, documentation: str, callback, labelnames=()):
+    """
+    Expose numbers another module already tracks (pool depth, cache hits...) as a scrape-time gauge.
+    """
+    return registry.register(Gauge(name, documentation, labelnames, callback=callback))
+
+def register_counters(name: str, documentation: str, callback, labelnames=()):
+    """
+    Same as register_gauges for totals that only ever grow; exposed as name_total.
+    """
+    return registry.register(Counter(name, documentation, labelnames, callback=callback))
+
+def instrument_engine(engine):
+    """
+    Time every SQL statement on engine. Not installed at all when metrics are disabled.
+    """
+    if not METRICS_ENABLED:
+        return
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _stop(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("metrics_started")
+        if started:
+            DB_QUERY_DURATION.observe(time.perf_counter() - started.pop(), statement.split(None, 1)[0].upper())
+
+    @event.listens_for(engine, "handle_error")
+    def _failed(context):
+        started = context.connection.info.get("metrics_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stacks of every thread every PROFILE_INTERVAL_MS while a request runs and
+    keeps the collapsed stacks ("frame;frame;frame count", flamegraph format) of app code.
+    Other requests running at the same time show up too; profile on a quiet instance.
+    """
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self.samples = _Tally()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self.started = None
+        self.duration_ms = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration_ms = round((time.perf_counter() - self.started) * 1000, 3)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    if "lounge_system" in code.co_filename:
+                        stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                if stack:
+                    self.samples[";".join(reversed(stack))] += 1
+
+    def result(self):
+        return {
+            "duration_ms": self.duration_ms,
+            "interval_ms": self.interval * 1000,
+            "samples": sum(self.samples.values()),
+            "stacks": [f"{stack} {count}" for stack, count in self.samples.most_common()],
+        }
+
+
+profiles = OrderedDict()  # profile id -> result, newest last
+_profiles_lock = threading.Lock()
+
+def _store_profile(profile_id: str, result: dict):
+    with _profiles_lock:
+        profiles[profile_id] = result
+        while len(profiles) > PROFILE_HISTORY:
+            profiles.popitem(last=False)
+
+def get_profile(profile_id: str):
+    with _profiles_lock:
+        return profiles.get(profile_id)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (no per-request task or body buffering): request count, latency by route
+    template, in-flight gauge, and the opt-in X-Profile sampling profiler.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = [500]
+        profiler = None
+        profile_id = None
+        if METRICS_PROFILING and any(key == PROFILE_HEADER for key, _ in scope.get("headers", ())):
+            profile_id = uuid.uuid4().hex[:12]
+            profiler = SamplingProfiler()
+            profiler.start()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                if profile_id is not None:
+                    message = dict(message, headers=list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())])
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUESTS.inc(scope["method"], template, str(status[0]))
+            HTTP_DURATION.observe(elapsed, scope["method"], template)
+            if profiler is not None:
+                # stop() joins the sampler thread; keep that wait off the event loop
+                await asyncio.to_thread(profiler.stop)
+                _store_profile(profile_id, dict(profiler.result(), route=template, status=status[0]))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _number(value) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
@@ -0,0 +1,48 @@
+import logging
+from sqlalchemy import inspect, text
+from .database import Base
+from . import models, embedding_store
+
+logger = logging.getLogger(__name__)
+
+def ensure_indexes(engine):
+    """
+    create_all only indexes tables it creates; add indexes declared since an existing table was built.
+    """
+    existing_tables = set(inspect(engine).get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {index["name"] for index in inspect(engine).get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                logger.info(f"Creating index {index.name}")
+                index.create(bind=engine)
+
+def ensure_columns(engine):
+    """
+    create_all never alters existing tables; add nullable columns declared since a table was built.
+    """
+    existing_tables = set(inspect(engine).get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column["name"] for column in inspect(engine).get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if not column.nullable:
+                raise RuntimeError(f"Cannot add non-nullable column {table.name}.{column.name} automatically")
+            logger.info(f"Adding column {table.name}.{column.name}")
+            column_type = column.type.compile(dialect=engine.dialect)
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+def upgrade(engine):
+    """
+    Bring an existing database (e.g. an old lounge.db) up to the current models.
+    """
+    Base.metadata.create_all(bind=engine)
+    ensure_columns(engine)
+    ensure_indexes(engine)
+    embedding_store.migrate_json_embeddings(engine)
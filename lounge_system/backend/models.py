@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime, JSON
+from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime, Date, Index, BigInteger
 from sqlalchemy.orm import relationship
 import datetime
 from .database import Base
+from .embedding_store import EmbeddingType
 
 class User(Base):
     __tablename__ = "users"
@@ -21,7 +22,7 @@ class FaceEmbedding(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
-    embedding = Column(JSON) # Normalized vector
+    embedding = Column(EmbeddingType) # Normalized vector, packed float32/int8 blob
 
     owner = relationship("User", back_populates="face_embedding")
 
@@ -56,6 +57,10 @@ class Booking(Base):
     lounge = relationship("Lounge", back_populates="bookings")
     orders = relationship("Order", back_populates="booking")
 
+    __table_args__ = (
+        Index("ix_bookings_user_lounge_date", "user_id", "lounge_id", "date"),
+    )
+
 class EntryLog(Base):
     __tablename__ = "entry_logs"
 
@@ -69,6 +74,11 @@ class EntryLog(Base):
 
     user = relationship("User", back_populates="entry_logs")
 
+    __table_args__ = (
+        Index("ix_entry_logs_timestamp", "timestamp"),
+        Index("ix_entry_logs_lounge_timestamp", "lounge_id", "timestamp"),
+    )
+
 class MenuItem(Base):
     __tablename__ = "menu_items"
 
@@ -91,10 +101,15 @@ class Order(Base):
     booking_id = Column(Integer, ForeignKey("bookings.id"))
     status = Column(String, default="pending") # pending, served
     total_price = Column(Float)
+    idempotency_key = Column(String, nullable=True) # client-supplied Idempotency-Key header
 
     booking = relationship("Booking", back_populates="orders")
     items = relationship("OrderItem", back_populates="order")
 
+    __table_args__ = (
+        Index("ux_orders_booking_idempotency_key", "booking_id", "idempotency_key", unique=True),
+    )
+
 class OrderItem(Base):
     __tablename__ = "order_items"
 
@@ -105,3 +120,25 @@ class OrderItem(Base):
 
     order = relationship("Order", back_populates="items")
     menu_item = relationship("MenuItem", back_populates="order_items")
+
+class StatCounter(Base):
+    __tablename__ = "stat_counters"
+
+    name = Column(String, primary_key=True) # users, bookings, paid_bookings, entries_granted, entries_denied
+    value = Column(BigInteger, default=0)
+
+class StatBucket(Base):
+    __tablename__ = "stat_buckets"
+
+    metric = Column(String, primary_key=True)
+    lounge_id = Column(Integer, primary_key=True) # 0 when the metric has no lounge (e.g. users)
+    bucket = Column(DateTime, primary_key=True) # start of the UTC hour
+    value = Column(BigInteger, default=0)
+
+class SlotOccupancy(Base):
+    __tablename__ = "slot_occupancy"
+
+    lounge_id = Column(Integer, ForeignKey("lounges.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    slot = Column(String, primary_key=True) # normalized, e.g. "10:00-12:00"
+    booked = Column(Integer, default=0)
@@ -0,0 +1,118 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from passlib.context import CryptContext
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Config
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_QUEUE_SIZE = int(os.getenv("PASSWORD_QUEUE_SIZE", "64"))  # max hashes queued or running
+RETRY_AFTER_SECONDS = 1
+
+# min == max == default: a hash made with any other cost is flagged for rehash on next login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+
+class PasswordPoolBusy(Exception):
+    """
+    Raised when too many password hashes are already queued; callers should answer 503.
+    """
+
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def verify_and_update(plain_password: str, hashed_password: str):
+    """
+    Returns (valid, new_hash); new_hash is set when the stored hash used a different cost.
+    """
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+class PasswordPool:
+    """
+    Bounded process pool for bcrypt, keeping its CPU off the API threadpool.
+    Also records end-to-end latency (queueing included) for percentile reporting.
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = max(1, workers)
+        self.queue_size = max(self.workers, queue_size)
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._latencies = {"hash": deque(maxlen=2048), "verify": deque(maxlen=2048)}
+
+    def start(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+            # Spawn the workers now rather than on the first login
+            for _ in range(self.workers):
+                self._executor.submit(int)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", hash_password, password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str):
+        return await self._run("verify", verify_and_update, plain_password, hashed_password)
+
+    async def _run(self, kind, fn, *args):
+        with self._lock:
+            if self._pending >= self.queue_size:
+                raise PasswordPoolBusy()
+            self._pending += 1
+        start = time.perf_counter()
+        try:
+            self.start()
+            return await asyncio.wrap_future(self._executor.submit(fn, *args))
+        finally:
+            with self._lock:
+                self._pending -= 1
+            elapsed = time.perf_counter() - start
+            self._latencies[kind].append(elapsed * 1000)
+            metrics.observe_stage(f"password_{kind}", elapsed)
+
+    def stats(self):
+        result = {"rounds": BCRYPT_ROUNDS, "workers": self.workers, "pending": self._pending}
+        for kind, samples in self._latencies.items():
+            if samples:
+                p50, p95, p99 = np.percentile(np.fromiter(samples, dtype=np.float64), [50, 95, 99])
+                result[kind] = {
+                    "count": len(samples),
+                    "p50_ms": round(float(p50), 2),
+                    "p95_ms": round(float(p95), 2),
+                    "p99_ms": round(float(p99), 2),
+                }
+            else:
+                result[kind] = {"count": 0}
+        return result
+
+
+pool = PasswordPool(PASSWORD_WORKERS, PASSWORD_QUEUE_SIZE)
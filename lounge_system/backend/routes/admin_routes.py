@@ -1,44 +1,232 @@
-from fastapi import APIRouter, Depends
+import base64
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from ..database import get_db
-from .. import models, auth
+from sqlalchemy import and_, or_
+import numpy as np
+from ..database import get_db, SessionLocal
+from .. import models, auth, passwords, stats, schemas, archive
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
+# Config
+LOG_PAGE_SIZE = 100
+MAX_LOG_PAGE_SIZE = 500
+EXPORT_PAGE_SIZE = 1000
+LOG_FIELDS = ["id", "username", "lounge", "status", "reason", "timestamp"]
+
+class LogFilters:
+    """
+    Shared query parameters for the log listing and export endpoints.
+    """
+    def __init__(
+        self,
+        lounge_id: Optional[int] = None,
+        status: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ):
+        self.lounge_id = lounge_id
+        self.status = status
+        self.since = since
+        self.until = until
+
+def encode_cursor(timestamp: datetime, log_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{log_id}".encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        timestamp, log_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(log_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def query_log_page(db: Session, filters: LogFilters, after=None, limit: int = LOG_PAGE_SIZE):
+    """
+    One page of entry logs, newest first, with user and lounge names joined in a single query.
+    after is a (timestamp, id) keyset position; the page starts strictly after it.
+    """
+    query = db.query(
+        models.EntryLog.id,
+        models.EntryLog.timestamp,
+        models.EntryLog.status,
+        models.EntryLog.reason,
+        models.User.username,
+        models.Lounge.name,
+    ).outerjoin(models.User, models.User.id == models.EntryLog.user_id
+    ).outerjoin(models.Lounge, models.Lounge.id == models.EntryLog.lounge_id)
+
+    if filters.lounge_id is not None:
+        query = query.filter(models.EntryLog.lounge_id == filters.lounge_id)
+    if filters.status is not None:
+        query = query.filter(models.EntryLog.status == filters.status)
+    if filters.since is not None:
+        query = query.filter(models.EntryLog.timestamp >= filters.since)
+    if filters.until is not None:
+        query = query.filter(models.EntryLog.timestamp < filters.until)
+    if after is not None:
+        timestamp, log_id = after
+        query = query.filter(or_(
+            models.EntryLog.timestamp < timestamp,
+            and_(models.EntryLog.timestamp == timestamp, models.EntryLog.id < log_id),
+        ))
+
+    rows = query.order_by(models.EntryLog.timestamp.desc(), models.EntryLog.id.desc()).limit(limit).all()
+    return [
+        {
+            "id": row.id,
+            "username": row.username or "Unknown",
+            "lounge": row.name or "Unknown",
+            "status": row.status,
+            "reason": row.reason,
+            "timestamp": row.timestamp,
+        }
+        for row in rows
+    ]
+
 @router.get("/stats")
-def get_stats(db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_admin_user)):
-    total_users = db.query(models.User).count()
-    total_bookings = db.query(models.Booking).count()
-    total_entries = db.query(models.EntryLog).filter(models.EntryLog.status == "Access Granted").count()
+def get_stats(db: Session = Depends(get_db), current_user: auth.Principal = Depends(auth.get_admin_user)):
+    # Maintained incrementally by stats.record, so this is one tiny read instead of table scans
+    totals = stats.get_totals(db)
     
     # Mock Revenue Calculation
-    revenue = db.query(models.Booking).filter(models.Booking.is_paid == True).count() * 50 # Let's say $50 per entry
+    revenue = totals[stats.PAID_BOOKINGS] * 50 # Let's say $50 per entry
     
     return {
-        "total_users": total_users,
-        "total_bookings": total_bookings,
-        "total_entries": total_entries,
+        "total_users": totals[stats.USERS],
+        "total_bookings": totals[stats.BOOKINGS],
+        "total_entries": totals[stats.ENTRIES_GRANTED],
         "revenue": revenue
     }
 
+@router.get("/stats/timeseries")
+def get_stats_timeseries(
+    metric: str = Query(stats.ENTRIES_GRANTED, pattern="^(" + "|".join(stats.METRICS) + ")$"),
+    lounge_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+    current_user: auth.Principal = Depends(auth.get_admin_user)
+):
+    return {"metric": metric, "lounge_id": lounge_id, "series": stats.get_series(db, metric, lounge_id, since, until)}
+
 @router.get("/logs")
-def get_logs(db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_admin_user)):
-    logs = db.query(models.EntryLog).order_by(models.EntryLog.timestamp.desc()).limit(100).all()
-    result = []
-    for log in logs:
-        user = db.query(models.User).filter(models.User.id == log.user_id).first()
-        lounge = db.query(models.Lounge).filter(models.Lounge.id == log.lounge_id).first()
-        result.append({
-            "id": log.id,
-            "username": user.username if user else "Unknown",
-            "lounge": lounge.name if lounge else "Unknown",
-            "status": log.status,
-            "reason": log.reason,
-            "timestamp": log.timestamp
-        })
-    return result
-
-@router.get("/users")
-def get_users(db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_admin_user)):
-    return db.query(models.User).all()
+def get_logs(
+    cursor: Optional[str] = None,
+    limit: int = Query(LOG_PAGE_SIZE, ge=1, le=MAX_LOG_PAGE_SIZE),
+    filters: LogFilters = Depends(),
+    db: Session = Depends(get_db),
+    current_user: auth.Principal = Depends(auth.get_admin_user)
+):
+    after = decode_cursor(cursor) if cursor else None
+    items = query_log_page(db, filters, after, limit)
+    next_cursor = encode_cursor(items[-1]["timestamp"], items[-1]["id"]) if len(items) == limit else None
+    return {"items": items, "next_cursor": next_cursor}
+
+@router.get("/logs/export")
+def export_logs(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    filters: LogFilters = Depends(),
+    current_user: auth.Principal = Depends(auth.get_admin_user)
+):
+    """
+    Stream every matching log row, paging by keyset so memory stays constant however many rows match.
+    """
+    def pages():
+        # The request's session is closed before streaming starts, so use our own
+        db = SessionLocal()
+        try:
+            after = None
+            while True:
+                page = query_log_page(db, filters, after, EXPORT_PAGE_SIZE)
+                for row in page:
+                    row["timestamp"] = row["timestamp"].isoformat()
+                yield page
+                if len(page) < EXPORT_PAGE_SIZE:
+                    break
+                after = (datetime.fromisoformat(page[-1]["timestamp"]), page[-1]["id"])
+        finally:
+            db.close()
+
+    def as_csv():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=LOG_FIELDS)
+        writer.writeheader()
+        for page in pages():
+            writer.writerows(page)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    def as_ndjson():
+        for page in pages():
+            yield "".join(json.dumps(row) + "\n" for row in page)
+
+    if format == "csv":
+        return StreamingResponse(as_csv(), media_type="text/csv",
+                                 headers={"Content-Disposition": "attachment; filename=entry_logs.csv"})
+    return StreamingResponse(as_ndjson(), media_type="application/x-ndjson")
+
+@router.get("/logs/archive")
+def get_archived_logs(
+    limit: int = Query(LOG_PAGE_SIZE, ge=1, le=MAX_LOG_PAGE_SIZE),
+    filters: LogFilters = Depends(),
+    db: Session = Depends(get_db),
+    current_user: auth.Principal = Depends(auth.get_admin_user)
+):
+    """
+    Entry logs already moved out of the database (older than ENTRY_LOG_HOT_DAYS): counts by day
+    and lounge for every match plus the newest `limit` rows, read straight from the segments.
+    """
+    rows = archive.store.scan(filters.since, filters.until, filters.lounge_id, filters.status)
+    newest = np.lexsort((rows["id"], rows["timestamp"]))[::-1][:limit]
+    user_ids = {int(user_id) for user_id in rows["user_id"][newest]}
+    lounge_ids = {int(lounge_id) for lounge_id in rows["lounge_id"][newest]}
+    usernames = dict(db.query(models.User.id, models.User.username).filter(models.User.id.in_(user_ids)).all())
+    lounges = dict(db.query(models.Lounge.id, models.Lounge.name).filter(models.Lounge.id.in_(lounge_ids)).all())
+    items = [
+        {
+            "id": int(rows["id"][i]),
+            "username": usernames.get(int(rows["user_id"][i]), "Unknown"),
+            "lounge": lounges.get(int(rows["lounge_id"][i]), "Unknown"),
+            "status": archive.GRANTED if rows["granted"][i] else "Access Denied",
+            "reason": str(rows["reason"][i]) or None,
+            "timestamp": archive.from_us(rows["timestamp"][i]),
+        }
+        for i in newest
+    ]
+    return dict(archive.store.summary_of(rows), items=items)
+
+@router.post("/logs/archive/run")
+def run_archiver(db: Session = Depends(get_db), current_user: auth.Principal = Depends(auth.get_admin_user)):
+    """
+    Archive everything past the hot window now instead of waiting for the next background pass.
+    """
+    return dict(archive.archiver.run_once(db), **archive.archiver.stats())
+
+@router.get("/auth-stats")
+def get_auth_stats(current_user: auth.Principal = Depends(auth.get_admin_user)):
+    return {"principal_cache": auth.principal_cache.stats(), "password_hashing": passwords.pool.stats()}
+
+@router.get("/users", response_model=schemas.UserPage)
+def get_users(
+    cursor: Optional[int] = Query(None, ge=0),
+    limit: int = Query(schemas.DEFAULT_PAGE_SIZE, ge=1, le=schemas.MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+    current_user: auth.Principal = Depends(auth.get_admin_user)
+):
+    """
+    Users by id, one keyset page at a time: only the public columns are selected, so a page
+    costs the same however many users exist.
+    """
+    query = db.query(*schemas.columns(models.User, schemas.UserOut))
+    if cursor is not None:
+        query = query.filter(models.User.id > cursor)
+    items = schemas.rows(query.order_by(models.User.id).limit(limit))
+    next_cursor = items[-1]["id"] if len(items) == limit else None
+    return {"items": items, "next_cursor": next_cursor}
@@ -1,8 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from ..database import get_db
-from .. import models, auth
+from .. import models, auth, passwords, stats
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/auth", tags=["auth"])
@@ -12,28 +13,65 @@ class UserCreate(BaseModel):
     password: str
     role: str = "user"
 
-@router.post("/signup")
-def signup(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.username == user.username).first()
-    if db_user:
-        raise HTTPException(status_code=400, detail="Username already registered")
-    
-    hashed_password = auth.get_password_hash(user.password)
+def password_pool_busy():
+    return HTTPException(
+        status_code=503,
+        detail="Too many sign-ins right now, please retry",
+        headers={"Retry-After": str(passwords.RETRY_AFTER_SECONDS)},
+    )
+
+# The handlers are async so bcrypt can be awaited on the password pool; their database work
+# runs in the threadpool so a locked SQLite file never stalls the event loop.
+
+def find_user(db: Session, username: str):
+    return db.query(models.User).filter(models.User.username == username).first()
+
+def create_user(db: Session, user: UserCreate, hashed_password: str) -> int:
     new_user = models.User(username=user.username, hashed_password=hashed_password, role=user.role)
     db.add(new_user)
+    stats.record(db, stats.USERS)
     db.commit()
     db.refresh(new_user)
-    return {"message": "User created successfully", "user_id": new_user.id}
+    return new_user.id
+
+def store_hash(db: Session, user: models.User, hashed_password: str):
+    user.hashed_password = hashed_password
+    db.commit()
+
+@router.post("/signup")
+async def signup(user: UserCreate, db: Session = Depends(get_db)):
+    db_user = await run_in_threadpool(find_user, db, user.username)
+    if db_user:
+        raise HTTPException(status_code=400, detail="Username already registered")
+    
+    try:
+        hashed_password = await passwords.pool.hash(user.password)
+    except passwords.PasswordPoolBusy:
+        raise password_pool_busy()
+    user_id = await run_in_threadpool(create_user, db, user, hashed_password)
+    return {"message": "User created successfully", "user_id": user_id}
 
 @router.post("/login")
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.username == form_data.username).first()
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    user = await run_in_threadpool(find_user, db, form_data.username)
+    valid, new_hash = False, None
+    if user:
+        try:
+            valid, new_hash = await passwords.pool.verify_and_update(form_data.password, user.hashed_password)
+        except passwords.PasswordPoolBusy:
+            raise password_pool_busy()
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+    # Read before any commit expires the instance (a reload would hit the database on the loop)
+    username, role = user.username, user.role
+    # Transparent rehash when BCRYPT_ROUNDS changed since this password was stored
+    if new_hash:
+        await run_in_threadpool(store_hash, db, user, new_hash)
     
-    access_token = auth.create_access_token(data={"sub": user.username})
-    return {"access_token": access_token, "token_type": "bearer", "role": user.role, "username": user.username}
+    access_token = auth.create_access_token(data={"sub": username})
+    return {"access_token": access_token, "token_type": "bearer", "role": role, "username": username}
@@ -0,0 +1,102 @@
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from ..database import SessionLocal
+from .. import auth, events
+
+router = APIRouter(prefix="/events", tags=["events"])
+
+# Occupancy is public (same data as GET /lounges/); entries and orders are admin-only
+PUBLIC_TOPICS = {events.OCCUPANCY}
+
+def resolve_topics(topics: str, token: Optional[str]):
+    """
+    Parse ?topics=a,b and check the caller may see them. EventSource cannot send
+    headers, so streams authenticate with ?token=<access token>.
+    Looks the principal up with a blocking session; call it via run_in_threadpool.
+    """
+    requested = {topic.strip() for topic in topics.split(",") if topic.strip()}
+    unknown = requested - set(events.TOPICS)
+    if not requested or unknown:
+        raise HTTPException(status_code=400, detail=f"topics must be a subset of {','.join(events.TOPICS)}")
+    if requested - PUBLIC_TOPICS:
+        if not token:
+            raise HTTPException(status_code=401, detail="Not authenticated")
+        db = SessionLocal()
+        try:
+            principal = auth.principal_from_token(token, db)
+        finally:
+            db.close()
+        if not principal.is_active or principal.role != "admin":
+            raise HTTPException(status_code=403, detail="Not enough permissions")
+    return requested
+
+def hub_full():
+    return HTTPException(status_code=503, detail="Too many live subscribers", headers={"Retry-After": "5"})
+
+def subscribe(topics, lounge_id):
+    try:
+        return events.hub.subscribe(topics, lounge_id)
+    except events.HubFull:
+        raise hub_full()
+
+@router.get("/stream")
+async def stream(
+    topics: str = events.OCCUPANCY,
+    lounge_id: Optional[int] = None,
+    token: Optional[str] = Query(None),
+):
+    """
+    Server-sent events. Slow clients are disconnected; EventSource reconnects on its own
+    and gets the latest occupancy replayed.
+    """
+    requested = await run_in_threadpool(resolve_topics, topics, token)
+    if events.hub.full:
+        raise hub_full()
+
+    async def body():
+        yield b"retry: 3000\n\n"
+        # Subscribe only once the body runs: a client gone before then never holds a hub slot
+        try:
+            subscription = events.hub.subscribe(requested, lounge_id)
+        except events.HubFull:
+            return  # filled up since the check above; EventSource retries
+        try:
+            async for message in subscription:
+                yield message.sse() if message is not None else b": keepalive\n\n"
+        finally:
+            subscription.close()
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.websocket("/ws")
+async def websocket_stream(
+    websocket: WebSocket,
+    topics: str = events.OCCUPANCY,
+    lounge_id: Optional[int] = None,
+    token: Optional[str] = None,
+):
+    try:
+        subscription = subscribe(await run_in_threadpool(resolve_topics, topics, token), lounge_id)
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=str(e.detail))
+        return
+
+    await websocket.accept()
+    try:
+        async for message in subscription:
+            if message is None:
+                await websocket.send_text('{"topic":"keepalive"}')
+            else:
+                await websocket.send_text(message.data)
+        # Dropped for falling behind (or shutdown)
+        await websocket.close(code=1013)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        subscription.close()
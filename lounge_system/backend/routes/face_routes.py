@@ -1,83 +1,254 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-import os
-import shutil
-import uuid
 from ..database import get_db
-from .. import models, auth, face_logic, express_entry
+from .. import models, auth, face_logic, frame_quality, express_entry, inference, entry_log, arrivals, metrics
+from datetime import datetime
+from ..face_index import gallery
 
 router = APIRouter(prefix="/face", tags=["face"])
 
-UPLOAD_DIR = "temp_uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+async def read_upload(file: UploadFile) -> bytes:
+    """
+    Read the upload into memory, enforcing the size limit. Nothing touches the disk.
+    """
+    data = await file.read(face_logic.MAX_UPLOAD_BYTES + 1)
+    if len(data) > face_logic.MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Image larger than {face_logic.MAX_UPLOAD_BYTES} bytes")
+    if not data:
+        raise HTTPException(status_code=400, detail="Empty image upload")
+    return data
+
+# Config
+MAX_REGISTER_BATCH = 64
+
+async def compute_embedding(image: bytes):
+    """
+    Run face inference in the worker pool so the event loop keeps serving other requests.
+    Concurrent scans are micro-batched into a single forward pass; an exact resubmission of a
+    recent frame is answered from the result cache. Raises frame_quality.PoorFrame for frames
+    the quality check rejected.
+    """
+    try:
+        result, cached = await inference.results.get_or_run(image, inference.batcher.embed)
+        if not cached:
+            metrics.observe_stages(result.get("timings"), prefix="face_")
+        if result.get("rejected"):
+            raise frame_quality.PoorFrame(result["rejected"], result["error"])
+        return result["embedding"]
+    except inference.InferenceBusy:
+        raise HTTPException(
+            status_code=503,
+            detail="Face scanner is busy, please retry",
+            headers={"Retry-After": str(inference.RETRY_AFTER_SECONDS)},
+        )
+    except inference.InferenceTimeout:
+        raise HTTPException(status_code=504, detail="Face scan timed out, please retry")
+
+# The handlers are async so inference can be awaited on the worker pool; their database work
+# runs in the threadpool so a locked SQLite file never stalls the event loop.
+
+def find_user(db: Session, user_id: int):
+    return db.query(models.User).filter(models.User.id == user_id).first()
+
+def find_user_ids(db: Session, usernames) -> dict:
+    return dict(db.query(models.User.username, models.User.id).filter(models.User.username.in_(usernames)))
+
+def store_embeddings(db: Session, embeddings: dict):
+    """
+    Insert or replace the face embedding of each {user_id: embedding}, in one commit.
+    """
+    existing = {
+        row.user_id: row
+        for row in db.query(models.FaceEmbedding).filter(models.FaceEmbedding.user_id.in_(list(embeddings))).all()
+    }
+    for user_id, embedding in embeddings.items():
+        if user_id in existing:
+            existing[user_id].embedding = embedding
+        else:
+            db.add(models.FaceEmbedding(user_id=user_id, embedding=embedding))
+    db.commit()
+
+def publish_embeddings(embeddings: dict):
+    """
+    Add stored embeddings to the gallery. The shared gallery appends under a file lock that a
+    compaction in any worker can hold for a whole snapshot write, so call this via asyncio.to_thread.
+    """
+    for user_id, embedding in embeddings.items():
+        gallery.upsert(user_id, embedding)
+
+def record_decision(decision, timings: dict = None):
+    metrics.observe_stages(timings if timings is not None else decision.timings)
+    if metrics.METRICS_ENABLED:
+        metrics.ENTRY_DECISIONS.inc(decision.code)
 
 @router.post("/register")
 async def register_face(
     file: UploadFile = File(...), 
     db: Session = Depends(get_db), 
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
 ):
-    # Save file temporarily
-    file_ext = file.filename.split(".")[-1]
-    file_path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4()}.{file_ext}")
-    
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    image = await read_upload(file)
     
     # Get embedding
-    embedding = face_logic.get_embedding(file_path)
-    
-    # Cleanup
-    if os.path.exists(file_path):
-        os.remove(file_path)
+    try:
+        embedding = await compute_embedding(image)
+    except frame_quality.PoorFrame as e:
+        raise HTTPException(status_code=400, detail=e.reason)
         
     if embedding is None:
         raise HTTPException(status_code=400, detail="No face detected or AI error. Please try another photo.")
     
     # Store embedding
-    db_embedding = db.query(models.FaceEmbedding).filter(models.FaceEmbedding.user_id == current_user.id).first()
-    if db_embedding:
-        db_embedding.embedding = embedding
-    else:
-        new_embedding = models.FaceEmbedding(user_id=current_user.id, embedding=embedding)
-        db.add(new_embedding)
-    
-    db.commit()
+    await run_in_threadpool(store_embeddings, db, {current_user.id: embedding})
+    await asyncio.to_thread(publish_embeddings, {current_user.id: embedding})
+    arrivals.expected.note_face(current_user.id, embedding)
+    auth.principal_cache.invalidate_user(current_user.id)
     return {"message": "Face registered successfully"}
 
+@router.post("/register-batch")
+async def register_faces_batch(
+    files: list[UploadFile] = File(...),
+    usernames: list[str] = Form(...),
+    db: Session = Depends(get_db),
+    current_user: auth.Principal = Depends(auth.get_admin_user)
+):
+    """
+    Bulk enrollment (e.g. a corporate or airline roster): files[i] is the photo of usernames[i].
+    """
+    if len(files) != len(usernames):
+        raise HTTPException(status_code=400, detail="files and usernames must have the same length")
+    if len(files) > MAX_REGISTER_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_REGISTER_BATCH} faces per batch")
+
+    user_ids = await run_in_threadpool(find_user_ids, db, usernames)
+
+    results = [{"username": username, "registered": False, "error": None} for username in usernames]
+    images, positions = [], []
+    for i, (file, username) in enumerate(zip(files, usernames)):
+        if username not in user_ids:
+            results[i]["error"] = "Unknown user"
+            continue
+        try:
+            images.append(await read_upload(file))
+            positions.append(i)
+        except HTTPException as e:
+            results[i]["error"] = e.detail
+
+    try:
+        embeddings = await inference.pool.run(face_logic.get_embeddings, images) if images else []
+    except inference.InferenceBusy:
+        raise HTTPException(
+            status_code=503,
+            detail="Face scanner is busy, please retry",
+            headers={"Retry-After": str(inference.RETRY_AFTER_SECONDS)},
+        )
+    except inference.InferenceTimeout:
+        raise HTTPException(status_code=504, detail="Batch enrollment timed out, try a smaller batch")
+
+    # Store embeddings
+    enrolled = {}
+    for i, result in zip(positions, embeddings):
+        if result["embedding"] is None:
+            results[i]["error"] = result["error"] or "No face detected"
+            continue
+        enrolled[user_ids[usernames[i]]] = result["embedding"]
+        results[i]["registered"] = True
+
+    if enrolled:
+        await run_in_threadpool(store_embeddings, db, enrolled)
+        await asyncio.to_thread(publish_embeddings, enrolled)
+    for user_id, embedding in enrolled.items():
+        arrivals.expected.note_face(user_id, embedding)
+        auth.principal_cache.invalidate_user(user_id)
+    return {"registered": sum(r["registered"] for r in results), "results": results}
+
 @router.post("/verify-entry/{lounge_id}")
 async def verify_entry(
     lounge_id: int,
     file: UploadFile = File(...), 
     db: Session = Depends(get_db), 
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
 ):
-    # Save file temporarily
-    file_ext = file.filename.split(".")[-1]
-    file_path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4()}.{file_ext}")
-    
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    timings = {}
+    with express_entry.stage(timings, "upload"):
+        image = await read_upload(file)
     
-    # Check entry eligibility
-    is_allowed, reason = express_entry.check_entry_eligibility(db, current_user, lounge_id, file_path)
+    # Check entry eligibility; face inference only runs if the booking checks pass
+    decision = await express_entry.check_entry_eligibility(db, current_user, lounge_id, image, compute_embedding)
     
-    # Log entry attempt
-    log = models.EntryLog(
-        user_id=current_user.id, 
-        lounge_id=lounge_id, 
-        status="Access Granted" if is_allowed else "Access Denied",
-        reason=reason
-    )
-    db.add(log)
-    db.commit()
-
-    # Cleanup
-    if os.path.exists(file_path):
-        os.remove(file_path)
+    # Log entry attempt (batched in the background, off the gate's critical path)
+    with express_entry.stage(timings, "log"):
+        await entry_log.writer.log(current_user.id, lounge_id, decision.allowed, decision.reason,
+                                   username=current_user.username, booking_id=decision.booking_id)
+    decision.timings = dict(timings, **decision.timings)
+    record_decision(decision)
         
     return {
-        "access_granted": is_allowed,
-        "reason": reason,
-        "user": current_user.username
+        "access_granted": decision.allowed,
+        "reason": decision.reason,
+        "code": decision.code,
+        "user": current_user.username,
+        "timings_ms": decision.timings
+    }
+
+@router.post("/identify/{lounge_id}")
+async def identify_entry(
+    lounge_id: int,
+    file: UploadFile = File(...), 
+    db: Session = Depends(get_db)
+):
+    """
+    Walk-up entry, no login needed. The face is matched against the passengers expected at this
+    lounge today first; the whole gallery is searched when that working set is not loaded or has
+    no match (e.g. a booking made through another worker since its last refresh).
+    """
+    timings = {}
+    with express_entry.stage(timings, "upload"):
+        image = await read_upload(file)
+    try:
+        with express_entry.stage(timings, "inference"):
+            embedding = await compute_embedding(image)
+    except frame_quality.PoorFrame as e:
+        record_decision(express_entry.Decision.deny(e.code, e.reason), timings)
+        return {"access_granted": False, "reason": e.reason, "code": e.code, "user": None, "timings_ms": timings}
+
+    if embedding is None:
+        raise HTTPException(status_code=400, detail="No face detected or AI error. Please try another photo.")
+
+    today = datetime.utcnow().date()
+    with express_entry.stage(timings, "match"):
+        gallery.sync()  # pick up faces enrolled through other workers
+        matches = arrivals.expected.search(lounge_id, today, embedding, k=1)
+        if not matches or matches[0][1] >= face_logic.SIMILARITY_THRESHOLD:
+            matches = gallery.search(embedding, k=1)
+    if not matches or matches[0][1] >= face_logic.SIMILARITY_THRESHOLD:
+        record_decision(express_entry.Decision.deny("face_not_recognised", "Face not recognised"), timings)
+        return {"access_granted": False, "reason": "Face not recognised", "code": "face_not_recognised", "user": None, "timings_ms": timings}
+
+    user_id, distance = matches[0]
+    user = arrivals.expected.arrival(lounge_id, user_id, today)
+    if user is None:
+        user = await run_in_threadpool(find_user, db, user_id)
+    if user is None or not user.is_active:
+        decision = express_entry.Decision.deny(express_entry.INACTIVE_USER, "Inactive user")
+    else:
+        decision = await express_entry.check_booking(db, user_id, lounge_id)
+    timings.update(decision.timings)
+
+    # Log entry attempt (batched in the background, off the gate's critical path)
+    username = user.username if user else None
+    with express_entry.stage(timings, "log"):
+        await entry_log.writer.log(user_id, lounge_id, decision.allowed, decision.reason,
+                                   username=username, booking_id=decision.booking_id)
+    record_decision(decision, timings)
+
+    return {
+        "access_granted": decision.allowed,
+        "reason": decision.reason,
+        "code": decision.code,
+        "user": username,
+        "confidence": max(0.0, 100 * (1 - distance)),
+        "timings_ms": timings
     }
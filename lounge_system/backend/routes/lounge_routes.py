@@ -1,15 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request, Response
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+import numpy as np
 from ..database import get_db
-from .. import models, auth
+from .. import models, auth, stats, capacity, events, catalog, arrivals, flight_status, schemas
 from pydantic import BaseModel
-from datetime import datetime, timedelta
+from typing import Optional
+from datetime import date as Date, datetime, time
 
 router = APIRouter(prefix="/lounges", tags=["lounges"])
 
+# Config
+MAX_IDEMPOTENCY_KEY_LENGTH = 128
+
 class BookingCreate(BaseModel):
     lounge_id: int
     slot: str
+    date: Optional[Date] = None # defaults to today (UTC)
+    flight_number: Optional[str] = None # status is fetched in the background right away
     card_number: str # Mock payment
     expiry: str
     cvv: str
@@ -22,72 +31,181 @@ class OrderCreate(BaseModel):
     booking_id: int
     items: list[OrderItemCreate]
 
-@router.get("/")
-def get_lounges(db: Session = Depends(get_db)):
-    return db.query(models.Lounge).all()
+def cached_json(request: Request, key, build):
+    """
+    Serve a catalog response from the cache, answering 304 when the client's ETag still matches.
+    """
+    cached = catalog.cache.get_or_build(key, build)
+    if cached is None:
+        raise HTTPException(status_code=404, detail="Lounge not found")
+    body, etag = cached
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.get("/", response_model=list[schemas.LoungeOut])
+def get_lounges(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=schemas.MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+):
+    return cached_json(request, catalog.page_key(catalog.LOUNGES, offset, limit), lambda: schemas.rows(
+        db.query(*schemas.columns(models.Lounge, schemas.LoungeOut))
+        .order_by(models.Lounge.id).offset(offset).limit(limit)
+    ))
+
+@router.get("/menu/{lounge_id}", response_model=list[schemas.MenuItemOut])
+def get_menu(
+    lounge_id: int,
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=schemas.MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+):
+    return cached_json(request, catalog.page_key(catalog.menu_key(lounge_id), offset, limit), lambda: schemas.rows(
+        db.query(*schemas.columns(models.MenuItem, schemas.MenuItemOut))
+        .filter(models.MenuItem.lounge_id == lounge_id).order_by(models.MenuItem.id).offset(offset).limit(limit)
+    ))
 
-@router.get("/menu/{lounge_id}")
-def get_menu(lounge_id: int, db: Session = Depends(get_db)):
-    return db.query(models.MenuItem).filter(models.MenuItem.lounge_id == lounge_id).all()
+def order_response(order: models.Order):
+    return {"message": "Order placed successfully", "order_id": order.id, "total": order.total_price}
+
+def find_order(db: Session, booking_id: int, idempotency_key: str):
+    return db.query(models.Order).filter(
+        models.Order.booking_id == booking_id, models.Order.idempotency_key == idempotency_key
+    ).first()
 
 @router.post("/order")
-def place_order(order: OrderCreate, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_active_user)):
+def place_order(
+    order: OrderCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, max_length=MAX_IDEMPOTENCY_KEY_LENGTH),
+    db: Session = Depends(get_db),
+    current_user: auth.Principal = Depends(auth.get_current_active_user),
+):
     booking = db.query(models.Booking).filter(models.Booking.id == order.booking_id, models.Booking.user_id == current_user.id).first()
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
-    
-    total_price = 0
-    new_order = models.Order(booking_id=order.booking_id, total_price=0)
+
+    # A retried request returns the order it already created
+    if idempotency_key:
+        existing = find_order(db, booking.id, idempotency_key)
+        if existing:
+            response.headers["Idempotent-Replayed"] = "true"
+            return order_response(existing)
+
+    if not order.items:
+        raise HTTPException(status_code=400, detail="Order has no items")
+    if any(item.quantity < 1 for item in order.items):
+        raise HTTPException(status_code=400, detail="Quantities must be at least 1")
+
+    # One query for every referenced menu item
+    ids = {item.menu_item_id for item in order.items}
+    menu = {
+        row.id: row for row in db.query(
+            models.MenuItem.id, models.MenuItem.price, models.MenuItem.lounge_id, models.MenuItem.is_available
+        ).filter(models.MenuItem.id.in_(ids))
+    }
+    invalid = sorted(
+        menu_item_id for menu_item_id in ids
+        if menu_item_id not in menu
+        or menu[menu_item_id].lounge_id != booking.lounge_id
+        or not menu[menu_item_id].is_available
+    )
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Menu items not available in this lounge: {invalid}")
+
+    prices = np.fromiter((menu[item.menu_item_id].price for item in order.items), dtype=np.float64, count=len(order.items))
+    quantities = np.fromiter((item.quantity for item in order.items), dtype=np.float64, count=len(order.items))
+    total_price = float(prices @ quantities)
+
+    new_order = models.Order(booking_id=booking.id, total_price=total_price, idempotency_key=idempotency_key)
     db.add(new_order)
-    db.flush()
-    
-    for item in order.items:
-        menu_item = db.query(models.MenuItem).filter(models.MenuItem.id == item.menu_item_id).first()
-        if menu_item:
-            total_price += menu_item.price * item.quantity
-            db.add(models.OrderItem(order_id=new_order.id, menu_item_id=item.menu_item_id, quantity=item.quantity))
-    
-    new_order.total_price = total_price
+    try:
+        db.flush()
+    except IntegrityError:
+        # A concurrent retry with the same key won the race
+        db.rollback()
+        existing = find_order(db, booking.id, idempotency_key)
+        if existing is None:
+            raise
+        response.headers["Idempotent-Replayed"] = "true"
+        return order_response(existing)
+
+    db.execute(insert(models.OrderItem), [
+        {"order_id": new_order.id, "menu_item_id": item.menu_item_id, "quantity": item.quantity}
+        for item in order.items
+    ])
     db.commit()
-    return {"message": "Order placed successfully", "order_id": new_order.id, "total": total_price}
+    events.hub.publish(events.ORDERS, {
+        "order_id": new_order.id,
+        "booking_id": booking.id,
+        "lounge_id": booking.lounge_id,
+        "status": new_order.status,
+        "total": total_price,
+    }, lounge_id=booking.lounge_id)
+    return order_response(new_order)
 
 @router.get("/flight/{flight_number}")
-def get_flight_info(flight_number: str):
-    # Mock Flight API
-    # Logic: return random data for hackathon demo
-    return {
-        "flight_number": flight_number,
-        "destination": "London (LHR)",
-        "gate": "B12",
-        "status": "On Time",
-        "departure_time": (datetime.now() + timedelta(hours=3)).strftime("%Y-%m-%dT%H:%M:%S")
-    }
+async def get_flight_info(flight_number: str):
+    """
+    Flight status from the configured provider (stub by default), cached and coalesced per flight.
+    """
+    normalized = flight_status.normalize_flight_number(flight_number)
+    if normalized is None:
+        raise HTTPException(status_code=400, detail="Invalid flight number")
+    try:
+        return await flight_status.client.get(normalized)
+    except flight_status.FlightUnavailable:
+        raise HTTPException(status_code=503, detail="Flight information unavailable", headers={"Retry-After": "5"})
 
-@router.get("/")
-def get_lounges(db: Session = Depends(get_db)):
-    return db.query(models.Lounge).all()
+@router.get("/{lounge_id}", response_model=schemas.LoungeDetailOut)
+def get_lounge(lounge_id: int, request: Request, db: Session = Depends(get_db)):
+    def build():
+        lounge = db.query(*schemas.columns(models.Lounge, schemas.LoungeOut)).filter(models.Lounge.id == lounge_id).first()
+        if not lounge:
+            return None
+        menu = db.query(*schemas.columns(models.MenuItem, schemas.MenuItemOut)).filter(
+            models.MenuItem.lounge_id == lounge_id
+        ).order_by(models.MenuItem.id)
+        return dict(
+            lounge._asdict(),
+            occupancy_percent=(lounge.occupancy / lounge.total_seats * 100) if lounge.total_seats > 0 else 0,
+            menu=schemas.rows(menu),
+        )
+    return cached_json(request, catalog.lounge_key(lounge_id), build)
 
-@router.get("/{lounge_id}")
-def get_lounge(lounge_id: int, db: Session = Depends(get_db)):
-    lounge = db.query(models.Lounge).filter(models.Lounge.id == lounge_id).first()
-    if not lounge:
+@router.get("/{lounge_id}/availability")
+def get_availability(lounge_id: int, day: Optional[Date] = None, only_available: bool = False, db: Session = Depends(get_db)):
+    day = day or datetime.utcnow().date()
+    slots = capacity.index.availability(db, lounge_id, day)
+    if slots is None:
         raise HTTPException(status_code=404, detail="Lounge not found")
-    return {
-        "id": lounge.id,
-        "name": lounge.name,
-        "airport": lounge.airport,
-        "total_seats": lounge.total_seats,
-        "occupancy": lounge.occupancy,
-        "occupancy_percent": (lounge.occupancy / lounge.total_seats * 100) if lounge.total_seats > 0 else 0,
-        "menu": lounge.menu_items
-    }
+    if only_available:
+        slots = [slot for slot in slots if slot["remaining"] > 0]
+    return {"lounge_id": lounge_id, "day": day.isoformat(), "slots": slots}
 
 @router.post("/book")
-def create_booking(booking: BookingCreate, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_active_user)):
-    # Simulating Seat Availability Check
-    lounge = db.query(models.Lounge).filter(models.Lounge.id == booking.lounge_id).first()
-    if not lounge or lounge.occupancy >= lounge.total_seats:
-         raise HTTPException(status_code=400, detail="Lounge is full or not found")
+def create_booking(booking: BookingCreate, db: Session = Depends(get_db), current_user: auth.Principal = Depends(auth.get_current_active_user)):
+    day = booking.date or datetime.utcnow().date()
+    if not capacity.bookable_day(day):
+        raise HTTPException(status_code=400, detail="Cannot book a date in the past")
+    slot = capacity.bookable_slot(booking.slot)
+    if slot is None:
+        raise HTTPException(status_code=400, detail=f"Unknown slot; choose one of {', '.join(capacity.DEFAULT_SLOTS)}")
+    flight_number = None
+    if booking.flight_number:
+        flight_number = flight_status.normalize_flight_number(booking.flight_number)
+        if flight_number is None:
+            raise HTTPException(status_code=400, detail="Invalid flight number")
+
+    # Atomic seat check-and-increment; nothing is written if the lounge or slot is full
+    if not capacity.reserve(db, booking.lounge_id, day, slot):
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Lounge is full or not found")
 
     # Simulate Payment Success
     is_paid = True if booking.card_number else False
@@ -99,16 +217,45 @@ def create_booking(booking: BookingCreate, db: Session = Depends(get_db), curren
     new_booking = models.Booking(
         user_id=current_user.id,
         lounge_id=booking.lounge_id,
-        slot=booking.slot,
+        date=datetime.combine(day, time.min),
+        slot=slot,
         is_paid=is_paid,
         status="confirmed",
+        flight_number=flight_number,
         qr_code=qr_data
     )
     db.add(new_booking)
-    
-    # Simulate Real-time Seat Occupancy Increment
-    lounge.occupancy += 1
+
+    stats.record(db, stats.BOOKINGS, booking.lounge_id)
+    if is_paid:
+        stats.record(db, stats.PAID_BOOKINGS, booking.lounge_id)
     
     db.commit()
     db.refresh(new_booking)
+    arrivals.expected.note_booking(db, new_booking.id)
+    if flight_number:
+        flight_status.client.prefetch(flight_number)
     return {"message": "Booking successful", "booking_id": new_booking.id, "is_paid": new_booking.is_paid, "qr_code": qr_data}
+
+@router.post("/checkout/{booking_id}")
+def checkout(booking_id: int, db: Session = Depends(get_db), current_user: auth.Principal = Depends(auth.get_current_active_user)):
+    booking = db.query(models.Booking).filter(models.Booking.id == booking_id, models.Booking.user_id == current_user.id).first()
+    if not booking:
+        raise HTTPException(status_code=404, detail="Booking not found")
+
+    # Only the request that flips check_out_time from NULL releases the seat
+    check_out_time = datetime.utcnow()
+    checked_out = db.query(models.Booking).filter(
+        models.Booking.id == booking_id, models.Booking.check_out_time.is_(None)
+    ).update({"check_out_time": check_out_time, "status": "completed"}, synchronize_session=False)
+    if not checked_out:
+        raise HTTPException(status_code=400, detail="Already checked out")
+
+    capacity.release(db, booking.lounge_id, booking.date.date(), capacity.normalize_slot(booking.slot or ""))
+    # Read after the update: a concurrent check-in either committed before it or now finds the booking checked out
+    if db.query(models.Booking.check_in_time).filter(models.Booking.id == booking_id).scalar() is not None:
+        capacity.check_out(db, booking.lounge_id)
+    db.commit()
+    events.hub.publish_occupancy(db.get(models.Lounge, booking.lounge_id))
+    arrivals.expected.note_checkout(booking.lounge_id, booking.date.date(), booking.id, check_out_time)
+    return {"message": "Checked out", "booking_id": booking.id}
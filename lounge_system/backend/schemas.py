@@ -0,0 +1,73 @@
+import json
+import importlib.util
+from typing import Optional
+from pydantic import BaseModel
+
+# orjson is optional: cached catalog bodies are encoded with it when it is installed
+HAS_ORJSON = importlib.util.find_spec("orjson") is not None
+if HAS_ORJSON:
+    import orjson
+
+# Config
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+class LoungeOut(BaseModel):
+    id: int
+    name: str
+    airport: str
+    total_seats: int
+    occupancy: int
+
+
+class MenuItemOut(BaseModel):
+    id: int
+    lounge_id: int
+    name: str
+    description: Optional[str] = None
+    price: float
+    is_veg: bool
+    is_available: bool
+    image_url: Optional[str] = None
+
+
+class LoungeDetailOut(LoungeOut):
+    occupancy_percent: float
+    menu: list[MenuItemOut]
+
+
+class UserOut(BaseModel):
+    id: int
+    username: str
+    role: str
+    is_active: bool
+
+
+class UserPage(BaseModel):
+    items: list[UserOut]
+    next_cursor: Optional[int] = None  # pass back as ?cursor= for the next page
+
+
+def columns(model, schema):
+    """
+    The model's columns named by the schema's fields, so a query loads exactly what the response
+    needs: db.query(*columns(models.User, UserOut)).
+    """
+    return [getattr(model, name) for name in schema.model_fields if name in model.__table__.columns]
+
+
+def rows(query) -> list:
+    """
+    Plain dicts from a projected query, ready for dumps() or a response_model.
+    """
+    return [row._asdict() for row in query]
+
+
+def dumps(payload) -> bytes:
+    """
+    Compact JSON bytes: orjson when installed, else the standard library.
+    """
+    if HAS_ORJSON:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(",", ":"), default=str).encode()
@@ -0,0 +1,113 @@
+import logging
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import func, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from . import models, archive
+
+logger = logging.getLogger(__name__)
+
+# Metrics kept as running totals plus per-lounge hourly buckets
+USERS = "users"
+BOOKINGS = "bookings"
+PAID_BOOKINGS = "paid_bookings"
+ENTRIES_GRANTED = "entries_granted"
+ENTRIES_DENIED = "entries_denied"
+METRICS = [USERS, BOOKINGS, PAID_BOOKINGS, ENTRIES_GRANTED, ENTRIES_DENIED]
+
+def hour_bucket(at: datetime) -> datetime:
+    return at.replace(minute=0, second=0, microsecond=0)
+
+def record(db: Session, metric: str, lounge_id: int = 0, at: datetime = None, amount: int = 1):
+    """
+    Add amount to a metric's total and to its (lounge, hour) bucket.
+    Runs in the caller's transaction, so the counters commit or roll back with the row they describe.
+    """
+    bucket = hour_bucket(at or datetime.utcnow())
+    _upsert(db, models.StatCounter, {"name": metric}, amount)
+    _upsert(db, models.StatBucket, {"metric": metric, "lounge_id": lounge_id or 0, "bucket": bucket}, amount)
+
+def record_entry(db: Session, lounge_id: int, granted: bool, at: datetime = None, amount: int = 1):
+    record(db, ENTRIES_GRANTED if granted else ENTRIES_DENIED, lounge_id, at, amount)
+
+def _upsert(db: Session, model, keys: dict, amount: int):
+    table = model.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(table).values(**keys, value=amount)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys), set_={"value": table.c.value + stmt.excluded.value}
+        )
+        db.execute(stmt)
+        return
+
+    # Generic fallback: increment in place, insert if the row does not exist yet
+    conditions = [table.c[key] == value for key, value in keys.items()]
+    result = db.execute(update(table).where(*conditions).values(value=table.c.value + amount))
+    if result.rowcount == 0:
+        db.execute(table.insert().values(**keys, value=amount))
+
+def get_totals(db: Session) -> dict:
+    totals = {metric: 0 for metric in METRICS}
+    totals.update(dict(db.query(models.StatCounter.name, models.StatCounter.value).all()))
+    return totals
+
+def get_series(db: Session, metric: str, lounge_id: int = None, since: datetime = None, until: datetime = None):
+    """
+    Hourly values of a metric, oldest first; summed across lounges unless lounge_id is given.
+    """
+    query = db.query(models.StatBucket.bucket, func.sum(models.StatBucket.value)).filter(models.StatBucket.metric == metric)
+    if lounge_id is not None:
+        query = query.filter(models.StatBucket.lounge_id == lounge_id)
+    if since is not None:
+        query = query.filter(models.StatBucket.bucket >= hour_bucket(since))
+    if until is not None:
+        query = query.filter(models.StatBucket.bucket < until)
+    rows = query.group_by(models.StatBucket.bucket).order_by(models.StatBucket.bucket).all()
+    return [{"bucket": bucket, "value": int(value)} for bucket, value in rows]
+
+def rebuild_if_empty(db: Session):
+    """
+    Backfill counters and buckets from the raw tables the first time the aggregate tables are seen empty.
+    Workers starting together may all see them empty; the backfill is one transaction, so the
+    first to commit wins and the others roll back on the counters' primary key.
+    """
+    if db.query(models.StatCounter).first() is not None:
+        return
+    logger.info("Rebuilding stats aggregates from raw tables")
+    totals = Counter({metric: 0 for metric in METRICS})
+    buckets = Counter()
+
+    def add(metric, lounge_id, at):
+        totals[metric] += 1
+        buckets[(metric, lounge_id or 0, hour_bucket(at or datetime.utcnow()))] += 1
+
+    totals[USERS] = db.query(models.User).count()
+    for lounge_id, date, is_paid in db.query(models.Booking.lounge_id, models.Booking.date, models.Booking.is_paid).yield_per(1000):
+        add(BOOKINGS, lounge_id, date)
+        if is_paid:
+            add(PAID_BOOKINGS, lounge_id, date)
+    for lounge_id, timestamp, status in db.query(models.EntryLog.lounge_id, models.EntryLog.timestamp, models.EntryLog.status).yield_per(1000):
+        add(ENTRIES_GRANTED if status == "Access Granted" else ENTRIES_DENIED, lounge_id, timestamp)
+    # Entry logs moved out of the hot table still count
+    for granted, lounge_id, hour, count in archive.store.hourly_counts():
+        metric = ENTRIES_GRANTED if granted else ENTRIES_DENIED
+        totals[metric] += count
+        buckets[(metric, lounge_id, hour)] += count
+
+    try:
+        db.execute(insert(models.StatCounter), [{"name": name, "value": value} for name, value in totals.items()])
+        if buckets:
+            db.execute(insert(models.StatBucket), [
+                {"metric": metric, "lounge_id": lounge_id, "bucket": bucket, "value": value}
+                for (metric, lounge_id, bucket), value in buckets.items()
+            ])
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        logger.info("Stats aggregates were rebuilt by another worker")
@@ -0,0 +1,7 @@
+"""
+Benchmark harness for the lounge API and face pipeline.
+
+    python -m lounge_system.bench --users 2000 --concurrency 1,16,64 --out results.json
+
+Runs offline: DeepFace is replaced by a deterministic fake embedder (FACE_EMBEDDER=fake).
+"""
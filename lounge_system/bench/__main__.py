@@ -0,0 +1,120 @@
+import os
+import sys
+import shutil
+import json
+import asyncio
+import argparse
+import platform
+import subprocess
+from datetime import datetime
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m lounge_system.bench", description="Benchmark the lounge API and face pipeline")
+    parser.add_argument("--db", default="bench.db", help="SQLite file to seed (recreated on every run)")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--entry-logs", type=int, default=50_000)
+    parser.add_argument("--concurrency", default="1,16,64", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario and concurrency level")
+    parser.add_argument("--scenarios", default="", help="comma-separated subset of scenarios (default: all)")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--skip-micro", action="store_true")
+    parser.add_argument("--skip-load", action="store_true")
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+def configure_environment(args):
+    """
+    Must run before the backend is imported: its modules read their config at import time.
+    """
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(args.db + suffix):
+            os.remove(args.db + suffix)
+    shutil.rmtree(args.db + ".faces", ignore_errors=True)
+    shutil.rmtree(args.db + ".archive", ignore_errors=True)
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(args.db)}"
+    os.environ["EMBEDDING_STORE_DIR"] = os.path.abspath(args.db) + ".faces"
+    os.environ["ENTRY_LOG_ARCHIVE_DIR"] = os.path.abspath(args.db) + ".archive"
+    os.environ["FACE_EMBEDDER"] = "fake"
+    os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    os.environ.setdefault("FACE_PRELOAD", "1")
+    # Seeded bookings are all for 10:00-12:00; let the gate scenarios run at any hour
+    os.environ.setdefault("ENTRY_ENFORCE_SLOT", "0")
+    # The scenarios re-send the same frames; measure the inference path, not the result cache
+    os.environ.setdefault("FACE_RESULT_CACHE_TTL", "0")
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def run_load(args, concurrency_levels):
+    import httpx
+    from ..backend.main import app
+    from .load import Context, scenarios, run_scenario, run_oversell, run_flight_status, run_archive
+
+    results = []
+    async with app.router.lifespan_context(app):
+        if getattr(app.state, "warmup_task", None):
+            await app.state.warmup_task
+        ctx = Context(args.users)
+        selected = {name for name in args.scenarios.split(",") if name}
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for scenario in scenarios(ctx):
+                if selected and scenario.name not in selected:
+                    continue
+                for concurrency in concurrency_levels:
+                    result = await run_scenario(client, scenario, concurrency, args.requests)
+                    print(json.dumps(result), file=sys.stderr)
+                    results.append(result)
+            if not selected or "oversell" in selected:
+                result = await run_oversell(client, ctx)
+                print(json.dumps(result), file=sys.stderr)
+                results.append(result)
+            if not selected or "flight_status" in selected:
+                result = await run_flight_status(client)
+                print(json.dumps(result), file=sys.stderr)
+                results.append(result)
+            if not selected or "archive" in selected:
+                # Last: it moves rows out of entry_logs
+                result = await run_archive(client, ctx)
+                print(json.dumps(result), file=sys.stderr)
+                results.append(result)
+    return results
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_environment(args)
+    concurrency_levels = [int(level) for level in args.concurrency.split(",") if level]
+
+    from .seed import seed
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "started_at": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+        },
+        "seed": seed(args.users, args.entry_logs),
+    }
+    if not args.skip_micro:
+        from . import micro
+        report["micro"] = micro.run()
+    if not args.skip_load:
+        report["load"] = asyncio.run(run_load(args, concurrency_levels))
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
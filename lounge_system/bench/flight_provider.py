@@ -0,0 +1,29 @@
+import asyncio
+from collections import Counter
+from datetime import datetime, timedelta
+from fastapi import FastAPI, HTTPException
+
+# Stand-in for the external flight-data provider (FLIGHT_PROVIDER=http). Run it on its own with
+#   uvicorn lounge_system.bench.flight_provider:app --port 9000
+# or mount it in-process through httpx.ASGITransport, as the benchmark does.
+LATENCY_SECONDS = 0.05
+
+app = FastAPI(title="Flight provider stand-in")
+app.state.calls = Counter()
+app.state.latency = LATENCY_SECONDS
+app.state.fail = False
+
+@app.get("/flights/{flight_number}")
+async def flight(flight_number: str):
+    app.state.calls[flight_number] += 1
+    await asyncio.sleep(app.state.latency)
+    if app.state.fail:
+        raise HTTPException(status_code=503, detail="Provider down")
+    return {
+        "flight_number": flight_number,
+        "destination": "Dubai (DXB)",
+        "gate": f"C{sum(map(ord, flight_number)) % 40 + 1}",
+        "status": "Boarding",
+        "departure_time": (datetime.now() + timedelta(minutes=45)).strftime("%Y-%m-%dT%H:%M:%S"),
+        "aircraft": "A350",
+    }
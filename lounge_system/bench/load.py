@@ -0,0 +1,250 @@
+import time
+from datetime import timedelta
+import random
+import asyncio
+import numpy as np
+import httpx
+from sqlalchemy import insert
+from ..backend import auth, models, flight_status, archive
+from ..backend.database import SessionLocal
+from .seed import BENCH_PASSWORD, face_image, username
+from . import flight_provider
+
+class Scenario:
+    """
+    One benchmarked request type. request(client, i) performs the i-th request and returns the response.
+    """
+
+    def __init__(self, name: str, request, ok_statuses=(200,)):
+        self.name = name
+        self.request = request
+        self.ok_statuses = ok_statuses
+
+
+class Context:
+    """
+    Seeded ids and pre-issued tokens, so flows other than login skip bcrypt.
+    """
+
+    def __init__(self, users: int):
+        self.users = users
+        self.rng = random.Random(42)
+        db = SessionLocal()
+        try:
+            user_ids = dict(db.query(models.User.username, models.User.id))
+            self.bookings = {
+                user_id: (booking_id, lounge_id)
+                for booking_id, user_id, lounge_id in db.query(models.Booking.id, models.Booking.user_id, models.Booking.lounge_id)
+            }
+            self.menu = {}
+            for item_id, lounge_id in db.query(models.MenuItem.id, models.MenuItem.lounge_id):
+                self.menu.setdefault(lounge_id, []).append(item_id)
+        finally:
+            db.close()
+        self.user_ids = [user_ids[username(i)] for i in range(users)]
+        self.tokens = [self.token(username(i)) for i in range(users)]
+        self.admin_headers = {"Authorization": f"Bearer {self.token('bench-admin')}"}
+
+    @staticmethod
+    def token(name: str) -> str:
+        return auth.create_access_token({"sub": name}, expires_delta=timedelta(hours=1))
+
+    def user(self, i: int) -> int:
+        return i % self.users
+
+    def headers(self, i: int):
+        return {"Authorization": f"Bearer {self.tokens[self.user(i)]}"}
+
+
+def scenarios(ctx: Context):
+    def login(client, i):
+        return client.post("/auth/login", data={"username": username(ctx.user(i)), "password": BENCH_PASSWORD})
+
+    def book(client, i):
+        lounge_id = ctx.bookings[ctx.user_ids[ctx.user(i)]][1]
+        return client.post("/lounges/book", headers=ctx.headers(i), json={
+            "lounge_id": lounge_id, "slot": "12:00-14:00", "card_number": "4111", "expiry": "12/30", "cvv": "123",
+        })
+
+    def order(client, i):
+        booking_id, lounge_id = ctx.bookings[ctx.user_ids[ctx.user(i)]]
+        items = ctx.rng.sample(ctx.menu[lounge_id], 3)
+        return client.post("/lounges/order", headers=ctx.headers(i), json={
+            "booking_id": booking_id, "items": [{"menu_item_id": item_id, "quantity": 1} for item_id in items],
+        })
+
+    def verify_entry(client, i):
+        lounge_id = ctx.bookings[ctx.user_ids[ctx.user(i)]][1]
+        return client.post(
+            f"/face/verify-entry/{lounge_id}", headers=ctx.headers(i),
+            files={"file": ("face.jpg", face_image(ctx.user(i)), "image/jpeg")},
+        )
+
+    def identify(client, i):
+        lounge_id = ctx.bookings[ctx.user_ids[ctx.user(i)]][1]
+        return client.post(f"/face/identify/{lounge_id}", files={"file": ("face.jpg", face_image(ctx.user(i)), "image/jpeg")})
+
+    return [
+        Scenario("lounges", lambda client, i: client.get("/lounges/")),
+        Scenario("lounge_detail", lambda client, i: client.get("/lounges/1")),
+        Scenario("login", login),
+        Scenario("book", book),
+        Scenario("order", order),
+        Scenario("verify_entry", verify_entry),
+        Scenario("identify", identify),
+        Scenario("admin_stats", lambda client, i: client.get("/admin/stats", headers=ctx.admin_headers)),
+        Scenario("admin_logs", lambda client, i: client.get("/admin/logs?limit=100", headers=ctx.admin_headers)),
+    ]
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, concurrency: int, requests: int, warmup: int = 5):
+    """
+    Issue `requests` calls with `concurrency` in flight; returns throughput and latency percentiles.
+    """
+    for i in range(min(warmup, requests)):
+        await scenario.request(client, i)
+
+    latencies = np.empty(requests, dtype=np.float64)
+    statuses = {}
+    counter = iter(range(requests))
+
+    async def worker():
+        for i in counter:
+            start = time.perf_counter()
+            response = await scenario.request(client, i)
+            latencies[i] = (time.perf_counter() - start) * 1000
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "scenario": scenario.name,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": sum(count for status, count in statuses.items() if status not in scenario.ok_statuses),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "throughput_rps": round(requests / elapsed, 1),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(latencies.max()), 3),
+    }
+
+async def run_oversell(client: httpx.AsyncClient, ctx: Context, seats: int = 10, attempts: int = 200, concurrency: int = 64):
+    """
+    Capacity stress: many concurrent bookings for a lounge with few seats must never oversell.
+    """
+    db = SessionLocal()
+    try:
+        lounge = models.Lounge(name="Oversell", airport="BENCH", total_seats=seats, occupancy=0)
+        db.add(lounge)
+        db.commit()
+        lounge_id = lounge.id
+    finally:
+        db.close()
+
+    async def book(client, i):
+        return await client.post("/lounges/book", headers=ctx.headers(i), json={
+            "lounge_id": lounge_id, "slot": "10:00-12:00", "card_number": "4111", "expiry": "12/30", "cvv": "123",
+        })
+
+    result = await run_scenario(client, Scenario("oversell", book, ok_statuses=(200, 400)), concurrency, attempts, warmup=0)
+    db = SessionLocal()
+    try:
+        occupancy = db.get(models.Lounge, lounge_id).occupancy
+        booked = db.query(models.Booking).filter(models.Booking.lounge_id == lounge_id).count()
+    finally:
+        db.close()
+    result.update({"seats": seats, "accepted": result["statuses"].get("200", 0), "occupancy": occupancy, "bookings": booked})
+    result["oversold"] = booked > seats or occupancy > seats
+    return result
+
+async def run_flight_status(client: httpx.AsyncClient, passengers: int = 200, flights: int = 5):
+    """
+    Flight board refresh against the in-process provider stand-in: `passengers` concurrent lookups
+    over `flights` flights must cost one provider call per flight. Then the provider goes down and
+    the cached data must still be served, marked stale.
+    """
+    provider = flight_status.HTTPProvider(
+        "http://flights/flights/{flight_number}", transport=httpx.ASGITransport(app=flight_provider.app)
+    )
+    original = flight_status.client
+    flight_status.client = flight_status.FlightStatusClient(provider, ttl=60, stale_ttl=60, timeout=2)
+    flight_provider.app.state.calls.clear()
+    flight_provider.app.state.fail = False
+    numbers = [f"LX{100 + i}" for i in range(flights)]
+    lookup = Scenario("flight_status", lambda client, i: client.get(f"/lounges/flight/{numbers[i % flights]}"))
+    try:
+        result = await run_scenario(client, lookup, concurrency=passengers, requests=passengers, warmup=0)
+        result["flights"] = flights
+        result["upstream_calls"] = sum(flight_provider.app.state.calls.values())
+        result["coalesced"] = result["upstream_calls"] == flights
+
+        # Provider outage once everything has expired: callers still get the last known status
+        flight_provider.app.state.fail = True
+        flight_status.client.ttl = flight_status.client.stale_ttl = 0
+        responses = await asyncio.gather(*(client.get(f"/lounges/flight/{number}") for number in numbers))
+        result["outage_served_stale"] = all(r.status_code == 200 and r.json()["stale"] for r in responses)
+    finally:
+        flight_provider.app.state.fail = False
+        await flight_status.client.close()
+        flight_status.client = original
+    return result
+
+async def run_archive(client: httpx.AsyncClient, ctx: Context, rows: int = 200_000, days: int = 60):
+    """
+    Tiered retention: `rows` entry logs spread over `days` days before the hot window are moved to
+    archive segments, then a week of one lounge's denials is answered from the segments alone.
+    """
+    rng = random.Random(7)
+    lounge_ids = sorted(ctx.menu)
+    oldest = archive.archiver.horizon() - timedelta(days=days)
+    db = SessionLocal()
+    try:
+        logs = [
+            {
+                "user_id": rng.choice(ctx.user_ids),
+                "lounge_id": rng.choice(lounge_ids),
+                "timestamp": oldest + timedelta(seconds=rng.randrange(days * 86400)),
+                "status": "Access Granted" if rng.random() < 0.9 else "Access Denied",
+                "reason": "Benchmark",
+            }
+            for _ in range(rows)
+        ]
+        for offset in range(0, rows, 10_000):
+            db.execute(insert(models.EntryLog), logs[offset:offset + 10_000])
+        db.commit()
+        hot_before = db.query(models.EntryLog).count()
+
+        start = time.perf_counter()
+        response = await client.post("/admin/logs/archive/run", headers=ctx.admin_headers)
+        archive_ms = (time.perf_counter() - start) * 1000
+        hot_after = db.query(models.EntryLog).count()
+    finally:
+        db.close()
+
+    since = oldest + timedelta(days=days // 2)
+    until = since + timedelta(days=7)
+    params = {"lounge_id": lounge_ids[0], "status": "Access Denied",
+              "since": since.isoformat(), "until": until.isoformat(), "limit": 50}
+    start = time.perf_counter()
+    queried = await client.get("/admin/logs/archive", headers=ctx.admin_headers, params=params)
+    query_ms = (time.perf_counter() - start) * 1000
+    expected = sum(
+        1 for log in logs
+        if log["lounge_id"] == lounge_ids[0] and log["status"] == "Access Denied" and since <= log["timestamp"] < until
+    )
+    return {
+        "scenario": "archive",
+        "rows": rows,
+        "archived": response.json()["archived"],
+        "hot_rows_before": hot_before,
+        "hot_rows_after": hot_after,
+        "segment_bytes": response.json()["bytes"],
+        "archive_ms": round(archive_ms, 1),
+        "query_ms": round(query_ms, 3),
+        "query_matched": queried.json()["matched"],
+        "query_correct": queried.json()["matched"] == expected,
+    }
@@ -0,0 +1,40 @@
+import timeit
+from datetime import timedelta
+import numpy as np
+from ..backend import auth, embedding_store, face_logic
+from ..backend.face_index import FaceGallery
+
+def measure(fn, number: int, repeat: int = 5):
+    """
+    Median and best time per call, in microseconds.
+    """
+    runs = [t / number * 1e6 for t in timeit.repeat(fn, number=number, repeat=repeat)]
+    return {"calls": number, "median_us": round(float(np.median(runs)), 3), "best_us": round(min(runs), 3)}
+
+def run(gallery_size: int = 10_000):
+    rng = np.random.default_rng(0)
+    a = rng.standard_normal(512).astype(np.float32)
+    b = rng.standard_normal(512).astype(np.float32)
+    a_list, b_list = a.tolist(), b.tolist()
+
+    blob_f32 = embedding_store.encode(a, quantize=False)
+    blob_i8 = embedding_store.encode(a, quantize=True)
+
+    token = auth.create_access_token({"sub": "bench0"}, expires_delta=timedelta(hours=1))
+    cache = auth.PrincipalCache(ttl=60, max_size=10)
+    cache.put(token, auth.Principal(1, "bench0", "user", True), float("inf"))
+
+    gallery = FaceGallery()
+    for user_id, vector in enumerate(rng.standard_normal((gallery_size, 512)).astype(np.float32)):
+        gallery.upsert(user_id, vector)
+
+    return {
+        "cosine_distance_ndarray": measure(lambda: face_logic.cosine_distance(a, b), 20_000),
+        "cosine_distance_list": measure(lambda: face_logic.cosine_distance(a_list, b_list), 5_000),
+        "embedding_decode_float32": measure(lambda: embedding_store.decode(blob_f32), 50_000),
+        "embedding_decode_int8": measure(lambda: embedding_store.decode(blob_i8), 50_000),
+        "embedding_encode": measure(lambda: embedding_store.encode(a), 20_000),
+        "token_decode_jwt": measure(lambda: auth.jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM]), 2_000),
+        "token_decode_cached": measure(lambda: cache.get(token), 100_000),
+        f"gallery_search_{gallery_size}": measure(lambda: gallery.search(a, k=1), 200),
+    }
@@ -0,0 +1,95 @@
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import insert, func
+from ..backend import models, face_logic, passwords, migrations, stats
+from ..backend.database import engine, SessionLocal
+
+BENCH_PASSWORD = "bench-password"
+SEED = 1234
+
+def face_image(user_index: int) -> bytes:
+    """
+    The "photo" of a seeded user; the fake embedder maps it to that user's stored embedding.
+    """
+    return f"bench-face-{user_index}".encode()
+
+def username(user_index: int) -> str:
+    return f"bench{user_index}"
+
+def seed(users: int, entry_logs: int, lounges: int = 2, menu_items: int = 20, seats: int = 100_000):
+    """
+    Fill an empty database: lounges with menus, users with embeddings and a paid booking for today,
+    and historical entry logs. One password hash is shared by every user so seeding stays fast.
+    """
+    migrations.upgrade(engine)
+    rng = random.Random(SEED)
+    db = SessionLocal()
+    try:
+        if db.query(func.count(models.User.id)).scalar():
+            raise SystemExit("Benchmark database is not empty; point DATABASE_URL at a fresh file")
+
+        db.execute(insert(models.Lounge), [
+            {"name": f"Bench Lounge {i + 1}", "airport": "BENCH", "total_seats": seats, "occupancy": 0}
+            for i in range(lounges)
+        ])
+        lounge_ids = [row.id for row in db.query(models.Lounge.id).order_by(models.Lounge.id)]
+        db.execute(insert(models.MenuItem), [
+            {
+                "lounge_id": lounge_id,
+                "name": f"Dish {i}",
+                "description": "Benchmark dish",
+                "price": round(rng.uniform(5, 50), 2),
+                "is_veg": bool(i % 2),
+                "is_available": True,
+            }
+            for lounge_id in lounge_ids for i in range(menu_items)
+        ])
+
+        hashed = passwords.hash_password(BENCH_PASSWORD)
+        db.execute(insert(models.User), [
+            {"username": username(i), "hashed_password": hashed, "role": "user", "is_active": True}
+            for i in range(users)
+        ])
+        db.execute(insert(models.User), [
+            {"username": "bench-admin", "hashed_password": hashed, "role": "admin", "is_active": True}
+        ])
+        user_ids = dict(db.query(models.User.username, models.User.id))
+
+        db.execute(insert(models.FaceEmbedding), [
+            {"user_id": user_ids[username(i)], "embedding": face_logic.fake_embedding(face_image(i))}
+            for i in range(users)
+        ])
+
+        today = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+        db.execute(insert(models.Booking), [
+            {
+                "user_id": user_ids[username(i)],
+                "lounge_id": lounge_ids[i % len(lounge_ids)],
+                "date": today,
+                "slot": "10:00-12:00",
+                "status": "confirmed",
+                "is_paid": True,
+                "qr_code": f"BENCH-{i}",
+            }
+            for i in range(users)
+        ])
+
+        start = datetime.utcnow() - timedelta(days=30)
+        for offset in range(0, entry_logs, 10_000):
+            db.execute(insert(models.EntryLog), [
+                {
+                    "user_id": user_ids[username(rng.randrange(users))],
+                    "lounge_id": rng.choice(lounge_ids),
+                    "timestamp": start + timedelta(seconds=rng.randrange(30 * 86400)),
+                    "status": "Access Granted" if rng.random() < 0.9 else "Access Denied",
+                    "reason": "Benchmark",
+                }
+                for _ in range(min(10_000, entry_logs - offset))
+            ])
+        db.commit()
+
+        # Counters and hourly buckets for the seeded history
+        stats.rebuild_if_empty(db)
+    finally:
+        db.close()
+    return {"users": users, "lounges": len(lounge_ids), "menu_items": len(lounge_ids) * menu_items, "entry_logs": entry_logs}
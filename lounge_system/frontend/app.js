@@ -20,6 +20,7 @@ const router = {
         if (viewName === 'dashboard') {
             loungeManager.fetchLounges();
             loungeManager.initSeatGrid();
+            loungeManager.subscribe();
         }
         if (viewName === 'menu') loungeManager.fetchMenu();
         if (viewName === 'navigation') loungeManager.initMapHotspots();
@@ -30,6 +31,7 @@ const router = {
 
         if (viewName === 'book') loungeManager.populateLoungeSelect();
         if (viewName === 'admin') adminManager.loadStats();
+        else adminManager.unsubscribe();
     },
 
     updateNav() {
@@ -143,6 +145,20 @@ const loungeManager = {
         } catch (e) { }
     },
 
+    subscribe() {
+        // Live occupancy pushed by the server instead of re-fetching /lounges/
+        if (this.events) return;
+        this.events = new EventSource(`${API_BASE}/events/stream?topics=occupancy`);
+        this.events.addEventListener('occupancy', (e) => {
+            const { data } = JSON.parse(e.data);
+            const lounge = this.lounges.find(l => l.id === data.lounge_id);
+            if (!lounge) return;
+            lounge.occupancy = data.occupancy;
+            lounge.total_seats = data.total_seats;
+            this.renderLounges();
+        });
+    },
+
     renderLounges() {
         const list = document.getElementById('lounge-list');
         if (!list) return;
@@ -308,9 +324,17 @@ const adminManager = {
             const resLogs = await fetch(`${API_BASE}/admin/logs`, {
                 headers: { 'Authorization': `Bearer ${token}` }
             });
-            const logs = await resLogs.json();
+            const { items: logs } = await resLogs.json();
             const list = document.getElementById('admin-logs-list');
-            list.innerHTML = logs.map(log => `
+            list.innerHTML = logs.map(log => this.renderLog(log)).join('');
+            this.subscribe(token);
+        } catch (e) {
+            showNotification("Admin sync failed", "error");
+        }
+    },
+
+    renderLog(log) {
+        return `
                 <div class="log-item" style="padding: 1rem; border-bottom: 1px solid var(--glass-border); font-size: 0.9rem;">
                     <div style="display:flex; justify-content:space-between;">
                          <strong>${log.username}</strong>
@@ -320,10 +344,28 @@ const adminManager = {
                         Lounge ID: ${log.lounge} | ${new Date(log.timestamp).toLocaleString()}
                     </div>
                 </div>
-            `).join('');
-        } catch (e) {
-            showNotification("Admin sync failed", "error");
-        }
+            `;
+    },
+
+    subscribe(token) {
+        // New entry-log rows are pushed as they are written; no re-polling
+        if (this.events) return;
+        this.events = new EventSource(`${API_BASE}/events/stream?topics=entries&token=${encodeURIComponent(token)}`);
+        this.events.addEventListener('entries', (e) => {
+            const { data } = JSON.parse(e.data);
+            const list = document.getElementById('admin-logs-list');
+            list.insertAdjacentHTML('afterbegin', this.renderLog({ ...data, lounge: data.lounge_id }));
+            // total_entries counts granted entries only, like /admin/stats
+            if (data.status === 'Access Granted') {
+                const total = document.getElementById('admin-total-entries');
+                total.innerText = parseInt(total.innerText || '0') + 1;
+            }
+        });
+    },
+
+    unsubscribe() {
+        if (this.events) this.events.close();
+        this.events = null;
     }
 };
 
@@ -0,0 +1,133 @@
+import threading
+from datetime import date
+import pytest
+from sqlalchemy.orm import sessionmaker
+from lounge_system.backend import models, capacity
+from lounge_system.backend.database import Base, create_db_engine
+
+DAYS = [date(2030, 1, 1), date(2030, 1, 2), date(2030, 1, 3)]
+SLOTS = ["10:00-12:00", "12:00-14:00"]
+
+
+@pytest.fixture
+def sessions(tmp_path):
+    # A file database, so every thread gets its own connection like uvicorn's threadpool does
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'capacity.db'}")
+    Base.metadata.create_all(engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+
+def add_lounge(sessions, seats: int) -> int:
+    db = sessions()
+    try:
+        lounge = models.Lounge(name="Test", airport="TST", total_seats=seats, occupancy=0)
+        db.add(lounge)
+        db.commit()
+        return lounge.id
+    finally:
+        db.close()
+
+
+def book(sessions, lounge_id: int, day: date, slot: str) -> bool:
+    db = sessions()
+    try:
+        taken = capacity.reserve(db, lounge_id, day, slot)
+        db.commit()
+        return taken
+    finally:
+        db.close()
+
+
+def test_concurrent_bookings_never_oversell_and_never_refuse_a_free_slot(sessions):
+    seats, attempts = 4, 7
+    lounge_id = add_lounge(sessions, seats)
+    keys = [(day, slot) for day in DAYS for slot in SLOTS]
+    barrier = threading.Barrier(len(keys) * attempts)
+    results = {key: [] for key in keys}
+
+    def attempt(key):
+        barrier.wait()
+        results[key].append(book(sessions, lounge_id, *key))
+
+    threads = [threading.Thread(target=attempt, args=(key,)) for key in keys for _ in range(attempts)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    db = sessions()
+    try:
+        booked = {
+            (row.day, row.slot): row.booked
+            for row in db.query(models.SlotOccupancy).filter(models.SlotOccupancy.lounge_id == lounge_id)
+        }
+        occupancy = db.get(models.Lounge, lounge_id).occupancy
+    finally:
+        db.close()
+    for key in keys:
+        # Exactly the seats of every (day, slot), whatever the other days and slots hold
+        assert results[key].count(True) == seats
+        assert booked[key] == seats
+    assert occupancy == 0  # nobody has checked in
+
+
+def test_full_slot_only_blocks_itself(sessions):
+    lounge_id = add_lounge(sessions, 2)
+    assert book(sessions, lounge_id, DAYS[0], SLOTS[0])
+    assert book(sessions, lounge_id, DAYS[0], SLOTS[0])
+    assert not book(sessions, lounge_id, DAYS[0], SLOTS[0])
+    assert book(sessions, lounge_id, DAYS[1], SLOTS[0])
+    assert book(sessions, lounge_id, DAYS[2], SLOTS[0])
+    assert book(sessions, lounge_id, DAYS[0], SLOTS[1])
+
+
+def test_occupancy_counts_check_ins_once(sessions):
+    lounge_id = add_lounge(sessions, 2)
+    db = sessions()
+    try:
+        booking = models.Booking(lounge_id=lounge_id, slot=SLOTS[0], is_paid=True)
+        db.add(booking)
+        db.commit()
+        assert capacity.check_in(db, booking.id, lounge_id)
+        assert not capacity.check_in(db, booking.id, lounge_id)
+        db.commit()
+        assert db.get(models.Lounge, lounge_id).occupancy == 1
+
+        capacity.check_out(db, lounge_id)
+        capacity.check_out(db, lounge_id)
+        db.commit()
+        db.expire_all()
+        assert db.get(models.Lounge, lounge_id).occupancy == 0
+    finally:
+        db.close()
+
+
+def test_only_listed_slots_are_bookable():
+    assert capacity.bookable_slot("10:00 - 12:00") == "10:00-12:00"
+    assert capacity.bookable_slot("00:00-00:01") is None
+    assert capacity.bookable_slot("x") is None
+
+
+def test_past_days_are_not_bookable():
+    today = date(2030, 1, 2)
+    assert capacity.bookable_day(today, today)
+    assert capacity.bookable_day(DAYS[2], today)
+    assert not capacity.bookable_day(DAYS[0], today)
+
+
+def test_full_lounge_only_admits_passengers_already_inside(sessions):
+    lounge_id = add_lounge(sessions, 1)
+    db = sessions()
+    try:
+        inside = models.Booking(lounge_id=lounge_id, slot=SLOTS[0], is_paid=True)
+        waiting = models.Booking(lounge_id=lounge_id, slot=SLOTS[0], is_paid=True)
+        db.add_all([inside, waiting])
+        db.commit()
+        assert capacity.has_room(db, lounge_id, waiting.id)
+        capacity.check_in(db, inside.id, lounge_id)
+        db.commit()
+        assert not capacity.has_room(db, lounge_id, waiting.id)
+        assert capacity.has_room(db, lounge_id, inside.id)
+    finally:
+        db.close()